@@ -1,13 +1,19 @@
 # Description: This file contains the MicrophoneStream class which is used to stream audio data from the microphone.
-import queue
-import sounddevice as sd
+import time
+import wave
+from threading import Condition
 
-class MicrophoneStream(object): # Create a MicrophoneStream class
-    def __init__(self, rate, chunk): # Initialize the MicrophoneStream class
+import numpy as np
+
+
+class AudioSource(object): # Shared start/stop handling and capture metrics for the audio sources
+    def __init__(self, rate, chunk):
         self._rate = rate
         self._chunk = chunk
-        self._buff = queue.Queue()
         self._closed = True
+        self.overflows = 0 # Chunks lost because the consumer fell behind, or the device reported an overflow
+        self.underruns = 0 # Times the consumer waited two chunk periods without receiving audio
+        self.chunks = 0 # Chunks handed to the consumer
 
     def __enter__(self): # Enter the context
         self._closed = False
@@ -24,15 +30,75 @@ class MicrophoneStream(object): # Create a MicrophoneStream class
         print("Stream has been closed")
         self._closed = True
 
-    def generator(self): # Generate audio chunks from the mic
-        # generate audio chunks from the mic
-        with sd.InputStream(samplerate=self._rate, channels=1, dtype='int16', blocksize=self._chunk) as stream:
+    @property
+    def rate(self): # Sample rate in Hz
+        return self._rate
+
+    @property
+    def metrics(self): # Capture counters for monitoring
+        return {"chunks": self.chunks, "overflows": self.overflows, "underruns": self.underruns}
+
+
+class MicrophoneStream(AudioSource): # Create a MicrophoneStream class
+    def __init__(self, rate, chunk, slots=32): # Initialize the MicrophoneStream class
+        super().__init__(rate, chunk)
+        self._ring = np.zeros((slots, chunk), dtype=np.int16) # Preallocated ring of chunk-sized slots
+        self._slots = slots
+        self._written = 0 # Chunks written by the audio callback
+        self._read = 0 # Chunks released by the consumer
+        self._ready = Condition()
+
+    def _callback(self, indata, frames, time_info, status): # Runs on the audio thread for every captured block
+        if status.input_overflow:
+            self.overflows += 1
+        with self._ready:
+            if self._written - self._read >= self._slots - 1: # Full: never overwrite the slot the consumer holds
+                self.overflows += 1
+                return
+            slot = self._ring[self._written % self._slots]
+            frames = min(frames, self._chunk)
+            slot[:frames] = indata[:frames, 0]
+            slot[frames:] = 0
+            self._written += 1
+            self._ready.notify()
+
+    def generator(self): # Generate audio chunks from the mic as memoryviews into the ring buffer
+        import sounddevice as sd # Loads PortAudio, so only when capture actually starts
+        self._written = self._read = 0
+        timeout = 2 * self._chunk / self._rate
+        with sd.InputStream(samplerate=self._rate, channels=1, dtype='int16', blocksize=self._chunk, callback=self._callback):
             while not self._closed: # while the stream is open
-                data, overflowed = stream.read(self._chunk) # read a chuck of audio
-                if overflowed: # if the buffer overflowed
-                    print("Audio buffer overflowed") # notify if buffer overflow
-                if data is not None and len(data) > 0: # if there is audio data
-                    self._buff.put(data.tobytes()) # put data into queue
-                    yield self._buff.get() # yield audio data from the queue
-                else:
-                    print("No audio data") # notify if no audio data
\ No newline at end of file
+                with self._ready:
+                    if self._written == self._read and not self._ready.wait(timeout):
+                        self.underruns += 1 # no audio data within two chunk periods
+                        continue
+                    slot = self._read % self._slots
+                self.chunks += 1
+                yield memoryview(self._ring[slot]).cast('B') # The slot stays reserved until the next chunk is requested
+                with self._ready:
+                    self._read += 1
+
+
+class WavFileStream(AudioSource): # Create a WavFileStream class that plays a WAV file through the MicrophoneStream interface
+    def __init__(self, rate, chunk, path, realtime=True):
+        super().__init__(rate, chunk)
+        self._path = path
+        self._realtime = realtime # Pace chunks like a live microphone, or hand them out as fast as they are read
+        with wave.open(path, 'rb') as wav:
+            if wav.getsampwidth() != 2 or wav.getframerate() != rate:
+                raise ValueError(f"{path} must be 16-bit PCM at {rate} Hz")
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+            self._samples = np.ascontiguousarray(samples[::wav.getnchannels()]) # Keep the first channel only
+
+    def generator(self): # Generate audio chunks from the file as memoryviews into its samples
+        period = self._chunk / self._rate
+        next_at = time.monotonic()
+        for start in range(0, len(self._samples), self._chunk):
+            if self._closed:
+                break
+            if self._realtime:
+                next_at += period
+                time.sleep(max(0.0, next_at - time.monotonic()))
+            self.chunks += 1
+            yield memoryview(self._samples[start:start + self._chunk]).cast('B')
+        self._closed = True # The file has ended, like a caller hanging up
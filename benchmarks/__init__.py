@@ -0,0 +1,19 @@
+# Description: Benchmarks for the hot paths of the call pipeline. Run with: python -m benchmarks.run
+import statistics
+import time
+
+
+def measure(fn, number=1, repeat=5): # Time fn over several runs and summarise the per-call cost in milliseconds
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) * 1000 / number)
+    return {
+        "min_ms": round(min(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "max_ms": round(max(samples), 4),
+        "runs": repeat,
+        "calls_per_run": number,
+    }
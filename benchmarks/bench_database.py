@@ -0,0 +1,56 @@
+# Description: Benchmarks for save_to_database and phone number lookups at growing table sizes.
+import os
+import tempfile
+
+from benchmarks import measure
+from benchmarks.synthetic import seeded
+from lookup import normalize_number
+
+
+def _row(i): # A record with a unique number
+    return {"number": f"{2000000000 + i}", "number_key": normalize_number(f"{2000000000 + i}"), "patient": "1", "dob": "06/21/2003", "lastName": "Smi",
+            "gender": "female", "state": "New York", "symptom": "I have a bad headache"}
+
+
+def _app(url): # A bare Flask app bound to the given database; the intake app itself is not needed to time it
+    from flask import Flask
+    from database import db
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    db.init_app(app)
+    return app
+
+
+def run(sizes=(10000, 100000, 1000000), samples=200): # Grow the table to each size and time saves and lookups
+    from database import db, phone, save_to_database
+    from lookup import patients
+    results = []
+    rng = seeded(2)
+    workdir = tempfile.TemporaryDirectory(prefix="bench-database-", ignore_cleanup_errors=True) # Never DATABASE_URL: the table is dropped and refilled
+    with workdir, _app(f"sqlite:///{os.path.join(workdir.name, 'bench.db')}").app_context():
+        db.drop_all()
+        db.create_all()
+        rows = 0
+        numbers = iter(range(10 ** 9, 2 * 10 ** 9)) # Shared by every size, so each save is a new number
+        for size in sizes:
+            for start in range(rows, size, 50000): # Bulk fill to the target size
+                db.session.execute(phone.__table__.insert(), [_row(i) for i in range(start, min(start + 50000, size))])
+                db.session.commit()
+            rows = size
+            results.append({"name": "database.save_to_database", "rows": size,
+                            **measure(lambda: save_to_database(_row(next(numbers))), number=samples // 10, repeat=10)})
+            rows += samples
+            lookups = [_row(rng.randrange(size))["number"] for _ in range(samples)]
+            keys = iter([normalize_number(number) for number in lookups] * 10)
+            results.append({"name": "phone.query.filter_by(number_key=...)", "rows": size,
+                            **measure(lambda: phone.query.filter_by(number_key=next(keys)).first(), number=samples // 10, repeat=10)})
+            patients.find_many(lookups) # Warm the cache so the lookups below are all hits
+            cached = iter(lookups * 10)
+            results.append({"name": "lookup.patients.find (cached)", "rows": size,
+                            **measure(lambda: patients.find(next(cached)), number=samples // 10, repeat=10)})
+            batches = iter([lookups[i:i + 50] for i in range(0, samples, 50)] * 10)
+            results.append({"name": "lookup.patients.find_many (50 numbers, cold)", "rows": size,
+                            **measure(lambda: patients.invalidate() or patients.find_many(next(batches)), number=1, repeat=10)})
+            db.session.remove()
+        db.engine.dispose() # Close the scratch file before it is removed
+    return results
@@ -0,0 +1,22 @@
+# Description: Benchmarks for the extraction.py functions and process_full_transcript.
+from benchmarks import measure
+from benchmarks.synthetic import seeded, transcript
+import extraction
+
+EXTRACTORS = ["extract_callback_number", "extract_is_patient", "extract_date_of_birth",
+              "extract_last_name_letters", "extract_gender", "extract_state", "extract_symptom"]
+
+
+def run(lengths=(500, 5000, 50000, 500000)): # Time every extractor at each transcript length
+    from stream import process_full_transcript
+    results = []
+    rng = seeded(1)
+    for length in lengths:
+        text = transcript(rng, length)
+        number = max(1, 20000 // length)
+        for name in EXTRACTORS:
+            fn = getattr(extraction, name)
+            results.append({"name": f"extraction.{name}", "chars": len(text), **measure(lambda: fn(text), number)})
+        results.append({"name": "extraction.extract_all", "chars": len(text), **measure(lambda: extraction.extract_all(text), number)})
+        results.append({"name": "stream.process_full_transcript", "chars": len(text), **measure(lambda: process_full_transcript(text), number)})
+    return results
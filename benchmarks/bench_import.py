@@ -0,0 +1,47 @@
+# Description: Benchmark for the startup cost of the app, checking that the heavy SDKs stay out of it.
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Only the call paths should load these; a web or CLI process that imports one at startup is a regression
+HEAVY_MODULES = ("numpy", "sounddevice", "google.cloud.speech", "google.cloud.texttospeech", "google.generativeai", "grpc")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP = """
+import json, sys, time
+started = time.perf_counter()
+import app
+app.create_app()
+elapsed = time.perf_counter() - started
+print(json.dumps({"ms": elapsed * 1000, "heavy": [name for name in %r if name in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _python(*args): # Run a fresh interpreter in the repository root
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+def slowest_imports(count=10): # The modules with the largest cumulative import time, from python -X importtime
+    stderr = _python('-X', 'importtime', '-c', 'import app; app.create_app()').stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((int(cumulative), name.strip()))
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in sorted(imports, reverse=True)[:count]]
+
+
+def run(repeat=5): # Time importing the app and building it in a fresh process
+    samples = []
+    heavy = set()
+    for _ in range(repeat):
+        result = json.loads(_python('-c', STARTUP).stdout.strip().splitlines()[-1])
+        samples.append(result["ms"])
+        heavy.update(result["heavy"])
+    return [{"name": "app.create_app (cold import)", "min_ms": round(min(samples), 1), "median_ms": round(statistics.median(samples), 1),
+             "max_ms": round(max(samples), 1), "runs": repeat, "heavy_modules_loaded": sorted(heavy), "ok": not heavy,
+             "slowest_imports": slowest_imports()}]
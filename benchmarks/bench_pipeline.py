@@ -0,0 +1,37 @@
+# Description: Benchmark for listen_print_loop driven by fake STT responses and fake Gemini and TTS backends.
+import contextlib
+import io
+import time
+
+from benchmarks.synthetic import dialog, seeded
+from fakes import FakeBackend, FakeGenerativeModel, FakeRecognizeResponse, FakeTextToSpeechClient
+
+
+def responses(rng, calls): # Interim and final recognition results for a number of synthetic calls
+    for _ in range(calls):
+        for _, answer in dialog(rng):
+            yield FakeRecognizeResponse(answer[:len(answer) // 2], False)
+            yield FakeRecognizeResponse(answer, True)
+
+
+def run(calls=5, gemini_latency=0.05, tts_latency=0.02): # Time whole conversations through the pipeline
+    from clients import provider
+    from sessions import CallSession
+    from stream import listen_print_loop
+    provider.use_backend(FakeBackend(gemini=FakeGenerativeModel(latency=gemini_latency),
+                                     tts=FakeTextToSpeechClient(latency=tts_latency)))
+    session = CallSession("benchmark", None, provider.get('gemini').start_chat(history=[]))
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # The loop prints every transcript and reply
+        listen_print_loop(responses(seeded(3), calls), session)
+    elapsed = time.perf_counter() - started
+    stages = {}
+    for timings in session.timings:
+        for stage, ms in timings.items():
+            if isinstance(ms, bool): # Flags such as 'interrupted' are counted below, not summarised as latencies
+                continue
+            stages.setdefault(stage, []).append(ms)
+    summary = {stage: {"median_ms": sorted(values)[len(values) // 2], "max_ms": max(values)} for stage, values in stages.items()}
+    return [{"name": "stream.listen_print_loop", "calls": calls, "turns": len(session.timings),
+             "interrupted": sum(1 for timings in session.timings if timings.get("interrupted")),
+             "total_s": round(elapsed, 3), "stages": summary}]
@@ -0,0 +1,51 @@
+# Description: Scripted calls through the incremental extractor and the dialog manager, checking the replies and the hints sent to Gemini.
+from dialog import DialogManager
+from extraction import IncrementalExtractor
+from prompts import SLOT_PROMPTS
+
+NUMBER_CONFIRMATION = "I have your callback number as 5 5 5 1 2 3 4 5 6 7. Is that correct?"
+
+
+def converse(utterances): # Feed each utterance as listen_print_loop does and return what the caller hears or Gemini is sent
+    from stream import with_next_question
+    extractor = IncrementalExtractor()
+    dialog = DialogManager(extractor)
+    turns = []
+    for utterance in utterances:
+        extractor.feed(utterance, dialog.question)
+        reply = dialog.handle(utterance)
+        turns.append(("local", reply) if reply is not None else ("gemini", with_next_question(utterance, dialog)))
+    return extractor, dialog, turns
+
+
+SCRIPTS = [ # (name, caller utterances, check taking the extractor, dialog and turns)
+    ("whole script answered locally", [
+        "Hi, my callback number is 555 123 4567.", "Yes.", "Yes, I am.", "June 21st, 2003.",
+        "S M I", "Female.", "New York.", "I have a bad headache."],
+     lambda extractor, dialog, turns: dialog.done and not extractor.missing and all(responder == "local" for responder, _ in turns)),
+    ("unclear number confirmation hints the confirmation, not the next slot", [
+        "Hi, my callback number is 555 123 4567.", "Uh huh."],
+     lambda extractor, dialog, turns: turns[1][0] == "gemini" and NUMBER_CONFIRMATION in turns[1][1]
+     and SLOT_PROMPTS["patient"] not in turns[1][1]),
+    ("number confirmed after an unclear answer", [
+        "Hi, my callback number is 555 123 4567.", "Uh huh.", "Yes, that's right."],
+     lambda extractor, dialog, turns: extractor.slots["number"] == "5551234567" and turns[2] == ("local", SLOT_PROMPTS["patient"])),
+    ("number rejected after an unclear answer", [
+        "Hi, my callback number is 555 123 4567.", "Uh huh.", "No, it's wrong."],
+     lambda extractor, dialog, turns: extractor.slots["number"] is None and turns[2] == ("local", SLOT_PROMPTS["number"])),
+    ("corrected number is read back again", [
+        "Hi, my callback number is 555 123 4567.", "No, it's 555 987 6543."],
+     lambda extractor, dialog, turns: turns[1] == ("local", "I have your callback number as 5 5 5 9 8 7 6 5 4 3. Is that correct?")),
+    ("unparsed answer hints the question being answered", [
+        "Hi, my callback number is 555 123 4567.", "Yes.", "Yes.", "I'd rather not say."],
+     lambda extractor, dialog, turns: turns[3] == ("gemini", f"I'd rather not say.\n(Next unanswered question: {SLOT_PROMPTS['dob']})")),
+]
+
+
+def run(): # Run every script and report the ones whose check fails
+    failures = []
+    for name, utterances, check in SCRIPTS:
+        extractor, dialog, turns = converse(utterances)
+        if not check(extractor, dialog, turns):
+            failures.append({"script": name, "turns": turns, "slots": extractor.slots})
+    return [{"name": "dialog scripts", "scripts": len(SCRIPTS), "failures": failures, "ok": not failures}]
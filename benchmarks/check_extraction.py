@@ -0,0 +1,109 @@
+# Description: Checks that the precompiled extractors give the same results as the original per-call regex versions.
+import re
+
+import extraction
+from benchmarks.synthetic import dialog, seeded
+
+# The extractors as they were before the patterns were precompiled, kept verbatim as the reference.
+# extract_symptom is not compared: its original variable-width lookbehind made re raise on every call.
+
+def legacy_callback_number(buffer):
+    match = re.search(r'\b(\d{3}[- ]?\d{3}[- ]?\d{4})\b', buffer)
+    if match:
+        return re.sub(r'[- ]', '', match.group(1))
+    return None
+
+
+def legacy_is_patient(buffer):
+    patterns = [
+        r'are you the patient\?\s*(yes|no)',
+        r'is this call for yourself\?\s*(yes|no)'
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, buffer, re.IGNORECASE)
+        if match:
+            return True if match.group(1).lower() == 'yes' else False
+    return None
+
+
+def legacy_date_of_birth(buffer):
+    month_to_number = {
+        'January': '01', 'February': '02', 'March': '03', 'April': '04',
+        'May': '05', 'June': '06', 'July': '07', 'August': '08',
+        'September': '09', 'October': '10', 'November': '11', 'December': '12'
+    }
+    match = re.search(r'\b(\d{1,2})[/-]?(\d{1,2})[/-]?(\d{4})\b', buffer)
+    if match:
+        return '/'.join(match.groups())
+    match = re.search(r'\b(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2})(st|nd|rd|th)?\s*(,)?\s*(\d{4})\b', buffer, re.IGNORECASE)
+    if match:
+        month, day, ordinal_suffix, comma, year = match.groups()
+        month_number = month_to_number[month.capitalize()]
+        return f"{month_number}/{day.zfill(2)}/{year}"
+    pattern = r'\b(' + '|'.join(month_to_number.keys()) + r')\s+(\d{1,2})\s+(\d{4})\b'
+    match = re.search(pattern, buffer, re.IGNORECASE)
+    if match:
+        month, day, year = match.groups()
+        month_number = month_to_number[month.capitalize()]
+        return f"{month_number}/{day.zfill(2)}/{year}"
+    match = re.search(r'\b(\d{1})(\d{2})(\d{4})\b', buffer)
+    if match:
+        month, day, year = match.groups()
+        return f"{month.zfill(2)}/{day.zfill(2)}/{year}"
+    return None
+
+
+def legacy_last_name_letters(buffer):
+    match = re.search(r'\b(?:the first three letters of your last name are |last name\? )([A-Za-z])\s+([A-Za-z])\s+([A-Za-z])\b', buffer, re.IGNORECASE)
+    if match:
+        return ''.join(match.groups()).capitalize()
+    match = re.search(r'\bmy last name is (\w{3})', buffer, re.IGNORECASE)
+    if match:
+        return match.group(1).capitalize()
+    return None
+
+
+def legacy_gender(buffer):
+    match = re.search(r'\b(male|female)\b', buffer, re.IGNORECASE)
+    if match:
+        return match.group(1)
+    return None
+
+
+def legacy_state(buffer):
+    for state in extraction.STATES:
+        if re.search(r'\b' + re.escape(state) + r'\b', buffer, re.IGNORECASE):
+            return state
+    return None
+
+
+PAIRS = { # Field to (current extractor, reference)
+    "number": (extraction.extract_callback_number, legacy_callback_number),
+    "patient": (extraction.extract_is_patient, legacy_is_patient),
+    "dob": (extraction.extract_date_of_birth, legacy_date_of_birth),
+    "lastName": (extraction.extract_last_name_letters, legacy_last_name_letters),
+    "gender": (extraction.extract_gender, legacy_gender),
+    "state": (extraction.extract_state, legacy_state),
+}
+
+
+def cases(rng, dialogs): # Whole calls with and without the questions, and every answer echoed after its question
+    for _ in range(dialogs):
+        turns = dialog(rng)
+        yield " ".join(answer for _, answer in turns)
+        yield " ".join(f"{question} {answer}" for question, answer in turns)
+        for question, answer in turns:
+            yield f"{question} {answer}"
+
+
+def run(dialogs=600): # Compare every extractor with its reference on the synthetic cases
+    checked = 0
+    mismatches = []
+    for text in cases(seeded(4), dialogs):
+        checked += 1
+        for field, (current, legacy) in PAIRS.items():
+            expected, got = legacy(text), current(text)
+            if expected != got:
+                mismatches.append({"field": field, "text": text, "expected": expected, "got": got})
+    return [{"name": "extraction parity with the original extractors", "cases": checked, "fields": sorted(PAIRS),
+             "mismatches": len(mismatches), "examples": mismatches[:5], "ok": not mismatches}]
@@ -0,0 +1,67 @@
+# Description: Runs the benchmark suite and writes the results as JSON.
+# Usage: python -m benchmarks.run [--quick] [--only extraction,parity,dialog,database,pipeline,import] [--output results.json]
+import argparse
+import importlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import traceback
+
+
+def _load(module): # Imported only when selected, after the environment below is set up
+    return importlib.import_module(f"benchmarks.{module}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the extraction, persistence and conversation hot paths.")
+    parser.add_argument('--only', default="extraction,parity,dialog,database,pipeline,import", help="Comma-separated benchmarks to run")
+    parser.add_argument('--quick', action='store_true', help="Smaller sizes, for a fast check")
+    parser.add_argument('--output', help="Write the JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="benchmarks-")
+    # Keep the benchmarks away from the real database, TTS cache and Google APIs
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['TTS_CACHE_DIR'] = os.path.join(workdir, 'tts_cache')
+    os.environ['CALL_BACKEND'] = 'fake'
+
+    benchmarks = { # Name -> function running it at the chosen sizes
+        'extraction': lambda: _load('bench_extraction').run((500, 5000) if args.quick else (500, 5000, 50000, 500000)),
+        'parity': lambda: _load('check_extraction').run(dialogs=200 if args.quick else 600),
+        'dialog': lambda: _load('check_dialog').run(),
+        'database': lambda: _load('bench_database').run((10000,) if args.quick else (10000, 100000, 1000000)),
+        'pipeline': lambda: _load('bench_pipeline').run(calls=1 if args.quick else 5),
+        'import': lambda: _load('bench_import').run(repeat=3 if args.quick else 10),
+    }
+    selected = args.only.split(',')
+    unknown = [name for name in selected if name not in benchmarks]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    results = []
+    for name in selected:
+        try:
+            results += benchmarks[name]()
+        except Exception as e: # One broken benchmark is reported, and fails the run, without hiding the others
+            traceback.print_exc()
+            results.append({"name": name, "error": f"{type(e).__name__}: {e}", "ok": False})
+
+    report = json.dumps({
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+    if not all(result.get("ok", True) for result in results): # e.g. a heavy SDK crept back into startup
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
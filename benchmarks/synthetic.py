@@ -0,0 +1,68 @@
+# Description: This file generates synthetic intake dialogs with varied phone, date and state phrasings.
+import random
+
+from extraction import MONTH_TO_NUMBER, STATES
+from prompts import SCRIPT_PROMPTS
+
+MONTHS = list(MONTH_TO_NUMBER)
+SYMPTOMS = ["I have a bad headache", "I have had a fever since yesterday", "My chest hurts when I breathe",
+            "I cut my hand cooking", "My son has a rash on his arm", "I feel dizzy and tired",
+            "I have been coughing for a week", "My ankle is swollen after a fall"]
+FILLERS = ["Um, let me think.", "Sorry, can you repeat that?", "Okay.", "Hold on one second.", "Sure."]
+
+
+def phone_number(rng): # A phone number in one of the ways callers say it
+    area, exchange, line = rng.randint(200, 999), rng.randint(200, 999), rng.randint(0, 9999)
+    return rng.choice([
+        f"{area} {exchange} {line:04d}",
+        f"{area}-{exchange}-{line:04d}",
+        f"{area}{exchange}{line:04d}",
+    ])
+
+
+def date_of_birth(rng): # A date of birth in one of the ways callers say it
+    month, day, year = rng.randint(1, 12), rng.randint(1, 28), rng.randint(1930, 2020)
+    name = MONTHS[month - 1]
+    suffix = {1: "st", 2: "nd", 3: "rd"}.get(day % 10 if day not in (11, 12, 13) else 0, "th")
+    return rng.choice([
+        f"{month:02d}/{day:02d}/{year}",
+        f"{month}-{day}-{year}",
+        f"{name} {day}{suffix}, {year}",
+        f"{name.lower()} {day} {year}",
+        f"{name} {day}, {year}",
+        f"{month}{day:02d}{year}" if month < 10 else f"{month}/{day}/{year}",
+    ])
+
+
+def dialog(rng): # One call as (question, answer) pairs, with the occasional filler turn
+    pairs = [
+        (SCRIPT_PROMPTS[0], f"Hi, my callback number is {phone_number(rng)}."),
+        (SCRIPT_PROMPTS[1], rng.choice(["Yes.", "Yes, that is correct.", "That's right."])),
+        (SCRIPT_PROMPTS[2], rng.choice(["Yes.", "No.", "Yes, I am the patient.", "No, it's for my son."])),
+        (SCRIPT_PROMPTS[3], f"It's {date_of_birth(rng)}."),
+        (SCRIPT_PROMPTS[4], rng.choice([f"My last name is {rng.choice(['Smith', 'Garcia', 'Nguyen', 'Brown'])}.",
+                                        " ".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(3)) + "."])),
+        (SCRIPT_PROMPTS[5], rng.choice(["Male.", "Female.", "I am a female.", "I'm male."])),
+        (SCRIPT_PROMPTS[6], rng.choice([f"I'm in {rng.choice(STATES)} right now.", f"{rng.choice(STATES)}."])),
+        (SCRIPT_PROMPTS[7], f"{rng.choice(SYMPTOMS)}."),
+    ]
+    turns = []
+    for question, answer in pairs:
+        if rng.random() < 0.15:
+            turns.append((question, rng.choice(FILLERS)))
+        turns.append((question, answer))
+    return turns
+
+
+def transcript(rng, min_chars): # A caller-side transcript, made of whole dialogs, at least min_chars long
+    parts = []
+    length = 0
+    while length < min_chars:
+        for _, answer in dialog(rng):
+            parts.append(answer)
+            length += len(answer) + 1
+    return " ".join(parts)
+
+
+def seeded(seed=0):
+    return random.Random(seed)
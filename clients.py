@@ -0,0 +1,123 @@
+# Description: This file contains the ClientProvider class which hands out shared, lazily created Speech, TTS and Gemini clients.
+import logging
+import os
+from threading import Lock
+
+from prompts import SYSTEM_INSTRUCTION
+
+GEMINI_MODEL = 'gemini-1.5-flash'
+
+
+class LiveBackend(object): # Creates the real Google clients and plays audio on the sound device
+    def create(self, name): # Create a new client by name
+        if name == 'speech':
+            from google.cloud import speech
+            return speech.SpeechClient()
+        if name == 'tts':
+            from google.cloud import texttospeech
+            return texttospeech.TextToSpeechClient()
+        if name == 'gemini':
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            return genai.GenerativeModel(GEMINI_MODEL, system_instruction=SYSTEM_INSTRUCTION)
+        raise KeyError(f"Unknown client {name}")
+
+    def check(self, name, client, timeout=2.0): # True if the client's channel is usable
+        channel = getattr(getattr(client, 'transport', None), 'grpc_channel', None)
+        if channel is None: # Gemini and REST transports have no channel to probe
+            return True
+        import grpc
+        try:
+            grpc.channel_ready_future(channel).result(timeout=timeout)
+            return True
+        except grpc.FutureTimeoutError:
+            return False
+
+    def is_transient(self, error): # True for errors worth reconnecting and retrying for
+        from google.api_core import exceptions
+        return isinstance(error, (exceptions.ServiceUnavailable, exceptions.DeadlineExceeded, exceptions.InternalServerError))
+
+    def open_player(self, rate): # A non-blocking, interruptible player on the sound device
+        from playback import PlaybackEngine
+        return PlaybackEngine(rate)
+
+
+class ClientProvider(object): # Create a ClientProvider class which shares one client of each kind between threads
+    def __init__(self, backend=None):
+        self._backend = backend # Resolved on first use so settings loaded from .env are seen
+        self._clients = {}
+        self._lock = Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = _default_backend()
+        return self._backend
+
+    def get(self, name): # Return the shared client, creating it on first use
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self.backend.create(name)
+                    self._clients[name] = client
+        return client
+
+    def reset(self, name=None): # Drop one client, or all of them, so the next get() reconnects
+        with self._lock:
+            if name is None:
+                self._clients.clear()
+            else:
+                self._clients.pop(name, None)
+
+    def use_backend(self, backend): # Switch to another backend, e.g. the fakes for offline load tests
+        with self._lock:
+            self._backend = backend
+            self._clients.clear()
+
+    def health(self): # Check every client created so far
+        with self._lock:
+            clients = dict(self._clients)
+        status = {}
+        for name, client in clients.items():
+            try:
+                status[name] = self.backend.check(name, client)
+            except Exception as e:
+                logging.error(f"Health check failed for {name} client: {e}")
+                status[name] = False
+            if not status[name]:
+                self.reset(name)
+        return status
+
+    def call(self, name, fn): # Run fn(client), reconnecting and retrying once on a transient error
+        try:
+            return fn(self.get(name))
+        except Exception as e:
+            if not self.backend.is_transient(e):
+                raise
+            logging.error(f"Reconnecting {name} client after error: {e}")
+            self.reset(name)
+            return fn(self.get(name))
+
+
+def _default_backend(): # CALL_BACKEND=fake runs the whole pipeline against local stand-ins
+    if os.getenv('CALL_BACKEND') == 'fake':
+        from fakes import FakeBackend
+        return FakeBackend()
+    return LiveBackend()
+
+
+provider = ClientProvider()
+
+
+def get_speech_client():
+    return provider.get('speech')
+
+
+def get_tts_client():
+    return provider.get('tts')
+
+
+def get_gemini_model():
+    return provider.get('gemini')
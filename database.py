@@ -1,19 +1,50 @@
 # Description: This file contains the database model and the function to save the details to the database.
 import logging
+import os
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
-from app import app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import validates
+from metrics import DB_COMMIT
+from lookup import normalize_number, patients
 
-db = SQLAlchemy(app)
+db = SQLAlchemy() # Bound to the app in create_app()
+
+DEFAULT_DATABASE_URL = 'sqlite:///myDB.db'
+INSTANCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance') # The app's instance folder
+
+
+def database_url(): # DATABASE_URL, with a relative SQLite path resolved into the instance folder as Flask-SQLAlchemy does
+    url = make_url(os.getenv('DATABASE_URL', DEFAULT_DATABASE_URL))
+    if url.drivername.startswith('sqlite') and url.database and url.database != ':memory:' and not os.path.isabs(url.database):
+        url = url.set(database=os.path.join(INSTANCE_PATH, url.database))
+    return url.render_as_string(hide_password=False)
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record): # Run SQLite in WAL mode so readers don't block the writer
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL") # Safe with WAL; skips an fsync per commit
+        cursor.close()
 
 class phone(db.Model): # Create a phone class
     id = db.Column(db.Integer, primary_key=True)
-    number = db.Column(db.String(15), index=True, unique=True)
-    patient = db.Column(db.String(100), index=True, unique=False)
-    dob = db.Column(db.String(100), index=True, unique=False)
-    lastName = db.Column(db.String(100), index=True, unique=False)
-    gender = db.Column(db.String(100), index=True, unique=False)
-    state = db.Column(db.String(100), index=True, unique=False)
-    symptom = db.Column(db.String(100), index=True, unique=False)
+    number = db.Column(db.String(15), unique=False) # The number as it was heard
+    number_key = db.Column(db.String(16), index=True, unique=True) # Normalized E.164-style number that lookups use
+    patient = db.Column(db.String(100), unique=False)
+    dob = db.Column(db.String(100), unique=False)
+    lastName = db.Column(db.String(100), unique=False)
+    gender = db.Column(db.String(100), unique=False)
+    state = db.Column(db.String(100), unique=False)
+    symptom = db.Column(db.String(100), unique=False)
+
+    @validates('number')
+    def set_number_key(self, key, number): # Keep the lookup key in step with the number
+        self.number_key = normalize_number(number)
+        return number
 
     def __repr__(self): # Return the phone number, patient name, date of birth, last name, state, and symptom
         return f"Phone number: {self.number} Name: {self.patient} DOB: {self.dob} Last Name: {self.lastName} State: {self.state} Symptom: {self.symptom}"
@@ -24,7 +55,9 @@ def save_to_database(details): # Save the details to the database
     try:
         new_entry = phone(**details)
         db.session.add(new_entry)
-        db.session.commit()
+        with DB_COMMIT.time(path="direct"):
+            db.session.commit()
+        patients.invalidate(details.get('number'))
         logging.info(f"Saved to database: {new_entry}")
     except Exception as e:
         db.session.rollback()
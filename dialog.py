@@ -0,0 +1,106 @@
+# Description: This file contains the DialogManager class which runs the intake script locally and only falls back to Gemini when an answer cannot be parsed.
+import re
+
+from extraction import (extract_callback_number, extract_is_patient, extract_date_of_birth, extract_last_name_letters,
+                        extract_gender, extract_state, extract_symptom)
+from prompts import SCRIPT_PROMPTS, SLOT_PROMPTS
+
+YES_PATTERN = re.compile(r"\b(yes|yeah|yep|correct|right|i am|it is)\b", re.IGNORECASE)
+NO_PATTERN = re.compile(r"\b(no|nope|not|wrong|incorrect)\b", re.IGNORECASE)
+
+CONFIRM_NUMBER_PROMPT = SCRIPT_PROMPTS[1]
+CLOSING_PROMPT = SCRIPT_PROMPTS[-1]
+
+
+def parse_yes_no(utterance): # True for a yes, False for a no, None if it is neither or both
+    yes, no = YES_PATTERN.search(utterance), NO_PATTERN.search(utterance)
+    if yes and not no:
+        return True
+    if no and not yes:
+        return False
+    return None
+
+
+def parse_patient(question, utterance): # The extractor expects the question echoed before the answer
+    value = extract_is_patient(f"{question} {utterance}")
+    return value if value is not None else parse_yes_no(utterance)
+
+
+def parse_symptom(question, utterance): # The extractor expects the answer to end with a full stop
+    return extract_symptom(f"{question} {utterance.rstrip()}.")
+
+
+SLOT_PARSERS = { # How each slot is read from the caller's answer to its question
+    "number": lambda question, utterance: extract_callback_number(utterance),
+    "patient": parse_patient,
+    "dob": lambda question, utterance: extract_date_of_birth(utterance),
+    "lastName": lambda question, utterance: extract_last_name_letters(f"{question} {utterance}"),
+    "gender": lambda question, utterance: extract_gender(utterance),
+    "state": lambda question, utterance: extract_state(utterance),
+    "symptom": parse_symptom,
+}
+
+
+class DialogManager(object): # Create a DialogManager class that asks the scripted questions in order
+    def __init__(self, extractor):
+        self.extractor = extractor # Shares its slots with the session's incremental extractor
+        self.question = None # The question the caller is answering
+        self.slot = None # The slot that question fills
+        self._pending_number = None # A callback number waiting for the caller to confirm it
+        self.done = False
+        self.local_turns = 0 # Turns answered without Gemini
+        self.fallback_turns = 0 # Turns handed to Gemini
+
+    def handle(self, utterance): # Return the next thing to say, or None when Gemini should handle the utterance
+        reply = self._step(utterance)
+        if reply is None:
+            self.fallback_turns += 1
+        else:
+            self.local_turns += 1
+        return reply
+
+    def _step(self, utterance):
+        if self.done:
+            return None
+        if self.question is None: # The caller spoke first; answer with the opening question unless it already has the number
+            self.question, self.slot = SCRIPT_PROMPTS[0], "number"
+            number = extract_callback_number(utterance)
+            return self._confirm_number(number) if number else self.question
+        if self._pending_number is not None:
+            answer = parse_yes_no(utterance)
+            number = extract_callback_number(utterance)
+            if number and number != self._pending_number: # A corrected number
+                return self._confirm_number(number)
+            if answer is None:
+                return None
+            if not answer:
+                self._pending_number = None
+                self.extractor.slots["number"] = None
+                return self._ask("number")
+            self.extractor.slots["number"] = self._pending_number
+            self._pending_number = None
+            return self._ask_next()
+        value = SLOT_PARSERS[self.slot](self.question, utterance)
+        if value is None:
+            return None
+        if self.slot == "number":
+            return self._confirm_number(value)
+        self.extractor.slots[self.slot] = value
+        return self._ask_next()
+
+    def _confirm_number(self, number): # Read the number back before moving on
+        self._pending_number = number
+        self.question = CONFIRM_NUMBER_PROMPT.format(number=" ".join(number))
+        return self.question
+
+    def _ask(self, slot):
+        self.slot, self.question = slot, SLOT_PROMPTS[slot]
+        return self.question
+
+    def _ask_next(self): # Ask for the next empty slot, or close the call
+        missing = self.extractor.missing
+        if not missing:
+            self.done = True
+            self.slot, self.question = None, CLOSING_PROMPT
+            return CLOSING_PROMPT
+        return self._ask(missing[0])
@@ -1,55 +1,105 @@
 # Description: This file contains functions to extract information from a buffer of text.
 import re
+from collections import deque
+
+
+def _vocabulary_pattern(words): # Build a regex alternation factored into a prefix tree, so each position is tried once per letter instead of once per word
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word.lower():
+            node = node.setdefault(char, {})
+        node[''] = {} # Marks the end of a word
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        group = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node: # A word ends here but longer ones continue
+            group = '(?:' + group + ')?'
+        return group
+
+    return build(trie)
+
+
+# Patterns are compiled once at import time instead of on every call
+CALLBACK_NUMBER_PATTERN = re.compile(r'\b(\d{3}[- ]?\d{3}[- ]?\d{4})\b')
+NUMBER_SEPARATORS = re.compile(r'[- ]')
+
+IS_PATIENT_PATTERNS = [ # Searched in order, the first one that matches wins
+    re.compile(r'are you the patient\?\s*(yes|no)', re.IGNORECASE),
+    re.compile(r'is this call for yourself\?\s*(yes|no)', re.IGNORECASE),
+]
+
+MONTH_TO_NUMBER = {
+    'January': '01', 'February': '02', 'March': '03', 'April': '04',
+    'May': '05', 'June': '06', 'July': '07', 'August': '08',
+    'September': '09', 'October': '10', 'November': '11', 'December': '12'
+}
+MONTHS = _vocabulary_pattern(MONTH_TO_NUMBER)
+NUMERIC_DATE_PATTERN = re.compile(r'\b(\d{1,2})[/-]?(\d{1,2})[/-]?(\d{4})\b')
+MONTH_DATE_PATTERN = re.compile(r'\b(' + MONTHS + r')\s+(\d{1,2})(st|nd|rd|th)?\s*(,)?\s*(\d{4})\b', re.IGNORECASE)
+PLAIN_MONTH_DATE_PATTERN = re.compile(r'\b(' + MONTHS + r')\s+(\d{1,2})\s+(\d{4})\b', re.IGNORECASE)
+COMPACT_DATE_PATTERN = re.compile(r'\b(\d{1})(\d{2})(\d{4})\b')
+
+SPELLED_LAST_NAME_PATTERN = re.compile(r'\b(?:the first three letters of your last name are |last name\? )([A-Za-z])\s+([A-Za-z])\s+([A-Za-z])\b', re.IGNORECASE)
+LAST_NAME_PATTERN = re.compile(r'\bmy last name is (\w{3})', re.IGNORECASE)
+
+GENDER_PATTERN = re.compile(r'\b(male|female)\b', re.IGNORECASE)
+
+STATES = ["Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado", "Connecticut", "Delaware",
+          "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa", "Kansas", "Kentucky",
+          "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan", "Minnesota", "Mississippi",
+          "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire", "New Jersey", "New Mexico",
+          "New York", "North Carolina", "North Dakota", "Ohio", "Oklahoma", "Oregon", "Pennsylvania",
+          "Rhode Island", "South Carolina", "South Dakota", "Tennessee", "Texas", "Utah", "Vermont",
+          "Virginia", "Washington", "West Virginia", "Wisconsin", "Wyoming"]
+STATE_RANK = {state.lower(): rank for rank, state in enumerate(STATES)}
+# One pass finds every state in the text. The lookahead keeps matches from consuming each other,
+# so "Virginia" is still seen inside "West Virginia" just as a separate search per state would
+STATE_PATTERN = re.compile(r'\b(?=(' + _vocabulary_pattern(STATES) + r')\b)', re.IGNORECASE)
+
+SYMPTOM_PATTERN = re.compile(r'tell me your main symptom or reason for the call today\.\s*([A-Za-z][^.]*)\.', re.IGNORECASE | re.DOTALL)
 
 
 def extract_callback_number(buffer): # Extract the callback number from the buffer
-    match = re.search(r'\b(\d{3}[- ]?\d{3}[- ]?\d{4})\b', buffer)
+    match = CALLBACK_NUMBER_PATTERN.search(buffer)
     if match:
-        return re.sub(r'[- ]', '', match.group(1))
+        return NUMBER_SEPARATORS.sub('', match.group(1))
     return None
 
 def extract_is_patient(buffer): # Extract whether the caller is the patient from the buffer
     # Searching for direct affirmations or negations following typical questions about the caller's identity
-    patterns = [
-        r'are you the patient\?\s*(yes|no)',
-        r'is this call for yourself\?\s*(yes|no)'
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, buffer, re.IGNORECASE)
+    for pattern in IS_PATIENT_PATTERNS:
+        match = pattern.search(buffer)
         if match:
             # Return True if 'yes', False if 'no'
             return True if match.group(1).lower() == 'yes' else False
     return None  # Return None if no clear answer is found
 
 def extract_date_of_birth(buffer): # Extract the date of birth from the buffer
-    month_to_number = {
-        'January': '01', 'February': '02', 'March': '03', 'April': '04',
-        'May': '05', 'June': '06', 'July': '07', 'August': '08',
-        'September': '09', 'October': '10', 'November': '11', 'December': '12'
-    }
-
     # Handle numerical date formats
-    match = re.search(r'\b(\d{1,2})[/-]?(\d{1,2})[/-]?(\d{4})\b', buffer)
+    match = NUMERIC_DATE_PATTERN.search(buffer)
     if match:
         return '/'.join(match.groups())
 
     # Handle month-day-year with possible ordinal suffixes and optional comma
-    match = re.search(r'\b(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2})(st|nd|rd|th)?\s*(,)?\s*(\d{4})\b', buffer, re.IGNORECASE)
+    match = MONTH_DATE_PATTERN.search(buffer)
     if match:
         month, day, ordinal_suffix, comma, year = match.groups()
-        month_number = month_to_number[month.capitalize()]
+        month_number = MONTH_TO_NUMBER[month.capitalize()]
         return f"{month_number}/{day.zfill(2)}/{year}"
 
     # Handle more generic month-day-year formats without explicit separators
-    pattern = r'\b(' + '|'.join(month_to_number.keys()) + r')\s+(\d{1,2})\s+(\d{4})\b'
-    match = re.search(pattern, buffer, re.IGNORECASE)
+    match = PLAIN_MONTH_DATE_PATTERN.search(buffer)
     if match:
         month, day, year = match.groups()
-        month_number = month_to_number[month.capitalize()]
+        month_number = MONTH_TO_NUMBER[month.capitalize()]
         return f"{month_number}/{day.zfill(2)}/{year}"
 
     # Handle compact numeric dates (e.g., 6212003)
-    match = re.search(r'\b(\d{1})(\d{2})(\d{4})\b', buffer)
+    match = COMPACT_DATE_PATTERN.search(buffer)
     if match:
         month, day, year = match.groups()
         return f"{month.zfill(2)}/{day.zfill(2)}/{year}"
@@ -58,40 +108,104 @@ def extract_date_of_birth(buffer): # Extract the date of birth from the buffer
 
 def extract_last_name_letters(buffer): # Extract the first three letters of the last name from the buffer
     # Capture spaced out letters and typical last name entries
-    match = re.search(r'\b(?:the first three letters of your last name are |last name\? )([A-Za-z])\s+([A-Za-z])\s+([A-Za-z])\b', buffer, re.IGNORECASE)
+    match = SPELLED_LAST_NAME_PATTERN.search(buffer)
     if match:
         return ''.join(match.groups()).capitalize()
     # Handle a more typical last name entry if three-letter format not used
-    match = re.search(r'\bmy last name is (\w{3})', buffer, re.IGNORECASE)
+    match = LAST_NAME_PATTERN.search(buffer)
     if match:
         return match.group(1).capitalize()
     return None
 
 def extract_gender(buffer):
-    match = re.search(r'\b(male|female)\b', buffer, re.IGNORECASE)
+    match = GENDER_PATTERN.search(buffer)
     if match:
         return match.group(1)
     return None
 
 def extract_state(buffer): # Extract the state name from the buffer
-    states = ["Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado", "Connecticut", "Delaware",
-              "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa", "Kansas", "Kentucky",
-              "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan", "Minnesota", "Mississippi",
-              "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire", "New Jersey", "New Mexico",
-              "New York", "North Carolina", "North Dakota", "Ohio", "Oklahoma", "Oregon", "Pennsylvania",
-              "Rhode Island", "South Carolina", "South Dakota", "Tennessee", "Texas", "Utah", "Vermont",
-              "Virginia", "Washington", "West Virginia", "Wisconsin", "Wyoming"]
-    for state in states:
-        if re.search(r'\b' + re.escape(state) + r'\b', buffer, re.IGNORECASE):
-            return state
+    # Earlier states in the list win, whatever order they appear in the text
+    found = {match.group(1).lower() for match in STATE_PATTERN.finditer(buffer)}
+    if found:
+        return STATES[min(STATE_RANK[state] for state in found)]
     return None
 
 def extract_symptom(buffer): # Extract the main symptom from the buffer
     # Enhance symptom capture by ignoring the echo of the question
-    pattern = r'(?<=tell me your main symptom or reason for the call today\.\s*)[A-Za-z].*?([^.]+)\.'
-    match = re.search(pattern, buffer, re.IGNORECASE | re.DOTALL)
+    match = SYMPTOM_PATTERN.search(buffer)
     if match:
         # Clean up response from any lead text echoed from the question
         response = match.group(1).strip()
         return response.replace('I\'m calling because ', '').replace('My symptom is ', '')
-    return None
\ No newline at end of file
+    return None
+
+def extract_all(buffer): # Extract every field from the buffer in one call
+    return {
+        "number": extract_callback_number(buffer),
+        "patient": extract_is_patient(buffer),
+        "dob": extract_date_of_birth(buffer),
+        "lastName": extract_last_name_letters(buffer),
+        "gender": extract_gender(buffer),
+        "state": extract_state(buffer),
+        "symptom": extract_symptom(buffer),
+    }
+
+
+FIELD_EXTRACTORS = { # Slot name to extractor, in the order the script asks for them
+    "number": extract_callback_number,
+    "patient": extract_is_patient,
+    "dob": extract_date_of_birth,
+    "lastName": extract_last_name_letters,
+    "gender": extract_gender,
+    "state": extract_state,
+    "symptom": extract_symptom,
+}
+QUESTION_FIELDS = {"patient", "lastName", "symptom"} # Slots whose patterns need the question echoed before the answer
+# Slots only filled from the answer to their own question: a phone number such as 555-123-4567 reads as the date 12/3/4567,
+# and a state or gender mentioned in passing is not an answer
+ANSWER_ONLY_FIELDS = {
+    "dob": re.compile(r'date of birth|\bborn\b', re.IGNORECASE),
+    "gender": re.compile(r'\b(?:male|female|gender|sex)\b', re.IGNORECASE),
+    "state": re.compile(r'\bstate\b', re.IGNORECASE),
+}
+
+
+def asked_fields(question): # The answer-only slots a question asks for
+    if not question:
+        return set()
+    return {field for field, pattern in ANSWER_ONLY_FIELDS.items() if pattern.search(question)}
+
+
+class IncrementalExtractor(object): # Fill the slots one final STT segment at a time
+    def __init__(self, window=2):
+        self.slots = dict.fromkeys(FIELD_EXTRACTORS)
+        self._recent = deque(maxlen=window) # The last few segments, for answers split across segments
+
+    @property
+    def missing(self): # Slots that are still empty, in script order
+        return [field for field, value in self.slots.items() if value is None]
+
+    def feed(self, segment, question=None): # Update the slots from a new segment and return the ones it filled
+        self._recent.append((question, segment))
+        text = " ".join(recent for _, recent in self._recent)
+        asked = asked_fields(question)
+        filled = {}
+        for field in self.missing:
+            if field in ANSWER_ONLY_FIELDS:
+                if field not in asked:
+                    continue
+                buffer = " ".join(recent for recent_question, recent in self._recent if recent_question == question) # Only this question's answer
+            elif question and field in QUESTION_FIELDS:
+                buffer = f"{question} {segment}"
+            else:
+                buffer = text
+            value = FIELD_EXTRACTORS[field](buffer)
+            if value is not None:
+                self.slots[field] = value
+                filled[field] = value
+        return filled
+
+    def details(self): # The slots as a record, or None if nothing was extracted
+        if any(self.slots.values()):
+            return dict(self.slots)
+        return None
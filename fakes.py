@@ -0,0 +1,169 @@
+# Description: This file contains local stand-ins for the Speech, TTS and Gemini clients, used for offline load tests.
+import io
+import time
+import wave
+from threading import Timer
+
+from playback import PlaybackHandle
+from prompts import SCRIPT_PROMPTS
+
+FAKE_CALLER_SCRIPT = [ # What the fake caller says, one final result per answer
+    "Hi, my callback number is 555 123 4567.",
+    "Yes, that is correct.",
+    "Yes, I am the patient.",
+    "My date of birth is June 21st, 2003.",
+    "My last name is Smith.",
+    "I am a female.",
+    "I am in New York right now.",
+    "I have had a bad headache since yesterday.",
+]
+
+
+class FakeAlternative(object):
+    def __init__(self, transcript):
+        self.transcript = transcript
+
+
+class FakeResult(object):
+    def __init__(self, transcript, is_final):
+        self.alternatives = [FakeAlternative(transcript)]
+        self.is_final = is_final
+
+
+class FakeRecognizeResponse(object):
+    def __init__(self, transcript, is_final):
+        self.results = [FakeResult(transcript, is_final)]
+
+
+class FakeSpeechClient(object): # Emits the caller script as the audio requests come in
+    def __init__(self, script=None, chunks_per_utterance=10):
+        self.script = script or FAKE_CALLER_SCRIPT
+        self.chunks_per_utterance = chunks_per_utterance # Audio chunks consumed before each final result
+
+    def streaming_recognize(self, config, requests):
+        utterances = iter(self.script)
+        utterance = next(utterances, None)
+        for count, _ in enumerate(requests, start=1):
+            if utterance is None:
+                continue # Keep draining the audio until the stream is closed
+            position = count % self.chunks_per_utterance
+            if position == self.chunks_per_utterance // 2:
+                yield FakeRecognizeResponse(utterance[:len(utterance) // 2], False)
+            elif position == 0:
+                yield FakeRecognizeResponse(utterance, True)
+                utterance = next(utterances, None)
+
+
+class FakeAudioResponse(object):
+    def __init__(self, audio_content):
+        self.audio_content = audio_content
+
+
+class FakeTextToSpeechClient(object): # Returns silence as a LINEAR16 WAV, about as long as the text would take to say
+    def __init__(self, latency=0.05, rate=24000, seconds_per_char=0.06):
+        self.latency = latency
+        self.rate = rate
+        self.seconds_per_char = seconds_per_char
+
+    def synthesize_speech(self, request):
+        time.sleep(self.latency)
+        text = request["input"].text
+        frames = int(len(text) * self.seconds_per_char * self.rate)
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.rate)
+            wav.writeframes(bytes(frames * 2))
+        return FakeAudioResponse(buffer.getvalue())
+
+
+class FakeChunk(object):
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeChatResponse(object): # Iterates as streamed chunks, like a stream=True response
+    def __init__(self, text, latency):
+        self.text = text
+        self._latency = latency
+
+    def __iter__(self):
+        words = self.text.split(' ')
+        for i, word in enumerate(words):
+            time.sleep(self._latency / len(words))
+            yield FakeChunk(word if i == 0 else ' ' + word)
+
+
+class FakeChat(object): # Walks through the intake script one question per message
+    def __init__(self, latency):
+        self.latency = latency
+        self.history = []
+        self._prompts = iter(SCRIPT_PROMPTS[1:])
+
+    def send_message(self, text, stream=False):
+        reply = next(self._prompts, SCRIPT_PROMPTS[-1]).format(number="5551234567")
+        self.history.append((text, reply))
+        response = FakeChatResponse(reply, self.latency)
+        if not stream:
+            time.sleep(self.latency)
+        return response
+
+
+class FakeGenerativeModel(object):
+    def __init__(self, latency=0.3):
+        self.latency = latency
+
+    def start_chat(self, history=None):
+        return FakeChat(self.latency)
+
+
+class FakePlayer(object): # Same interface as playback.PlaybackEngine, without a sound device
+    def __init__(self, rate, playback_speed):
+        self.rate = rate
+        self.playback_speed = playback_speed # 1.0 plays in real time, 0 finishes at once
+        self.played = 0 # Number of samples "played"
+        self._handles = []
+
+    def play(self, audio):
+        handle = PlaybackHandle(audio)
+        self.played += len(audio)
+        self._handles = [h for h in self._handles if not h.done] + [handle]
+        if self.playback_speed:
+            Timer(len(audio) / self.rate * self.playback_speed, handle.finish).start()
+        else:
+            handle.finish()
+        return handle
+
+    def cancel_all(self):
+        for handle in self._handles:
+            handle.cancel()
+
+    @property
+    def is_playing(self):
+        return any(not handle.done for handle in self._handles)
+
+    def close(self):
+        self.cancel_all()
+
+
+class FakeBackend(object): # Drop-in replacement for clients.LiveBackend
+    def __init__(self, speech=None, tts=None, gemini=None, playback_speed=0.0):
+        self._factories = {
+            'speech': lambda: speech or FakeSpeechClient(),
+            'tts': lambda: tts or FakeTextToSpeechClient(),
+            'gemini': lambda: gemini or FakeGenerativeModel(),
+        }
+        self.playback_speed = playback_speed # 1.0 plays in real time, 0 returns immediately
+
+    def create(self, name):
+        return self._factories[name]()
+
+    def check(self, name, client, timeout=2.0):
+        return True
+
+    def is_transient(self, error):
+        return False
+
+    def open_player(self, rate):
+        return FakePlayer(rate, self.playback_speed)
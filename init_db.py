@@ -1,4 +1,34 @@
-from app import db, app
+import logging
 
-with app.app_context():
+from sqlalchemy import inspect, text
+
+from app import create_app
+from database import db
+from lookup import normalize_number
+
+OLD_INDEXES = ["ix_phone_number", "ix_phone_patient", "ix_phone_dob", "ix_phone_lastName", "ix_phone_gender", "ix_phone_state", "ix_phone_symptom"]
+
+
+def migrate_phone_table(): # Bring a database created before number_key existed up to date
+    columns = [column["name"] for column in inspect(db.engine).get_columns("phone")]
+    with db.engine.begin() as connection:
+        for index in OLD_INDEXES: # Lookups only use number_key; the other indexes just slowed inserts
+            connection.execute(text(f'DROP INDEX IF EXISTS "{index}"'))
+        if "number_key" not in columns:
+            connection.execute(text("ALTER TABLE phone ADD COLUMN number_key VARCHAR(16)"))
+        rows = connection.execute(text("SELECT id, number FROM phone WHERE number_key IS NULL ORDER BY id DESC")).fetchall()
+        taken = {key for (key,) in connection.execute(text("SELECT number_key FROM phone WHERE number_key IS NOT NULL"))}
+        for row_id, number in rows: # Newest rows first, so the latest record of a number keeps the key
+            key = normalize_number(number)
+            if key is None or key in taken:
+                if key is not None:
+                    logging.warning(f"Record {row_id} duplicates {key}; leaving it without a lookup key")
+                continue
+            taken.add(key)
+            connection.execute(text("UPDATE phone SET number_key = :key WHERE id = :id"), {"key": key, "id": row_id})
+        connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_phone_number_key ON phone (number_key)"))
+
+
+with create_app().app_context():
     db.create_all()
+    migrate_phone_table()
@@ -0,0 +1,91 @@
+# Description: This file contains the PatientLookup class which finds intake records by phone number through a TTL'd LRU cache.
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from metrics import LOOKUP_CACHE
+
+NON_DIGITS = re.compile(r'\D')
+DEFAULT_COUNTRY_CODE = "1"
+
+
+def normalize_number(number): # Canonical E.164-style key for a phone number, e.g. '(555) 123-4567' -> '+15551234567'
+    if number is None:
+        return None
+    digits = NON_DIGITS.sub('', str(number))
+    if not digits:
+        return None
+    if len(digits) == 10: # A national number without its country code
+        digits = DEFAULT_COUNTRY_CODE + digits
+    return "+" + digits
+
+
+def record_to_dict(record): # Plain copy of a row, safe to cache and share between requests
+    return {column.name: getattr(record, column.name) for column in record.__table__.columns}
+
+
+class PatientLookup(object): # Create a PatientLookup class that answers number lookups from memory when it can
+    def __init__(self, max_items=1024, ttl=30.0):
+        self.max_items = max_items # Size of the LRU
+        self.ttl = ttl # Seconds a cached answer is trusted; bounds staleness from writers in other processes
+        self._cache = OrderedDict() # number key -> (expires at, record dict or None)
+        self._generation = 0 # Bumped by every invalidate(), so answers read before it are not cached
+        self._lock = Lock()
+
+    def _cached(self, key): # Return (found, record) for a key
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return False, None
+            self._cache.move_to_end(key)
+            return True, entry[1]
+
+    def _remember(self, key, record, generation): # Misses are cached too, so polling an unknown number stays cheap
+        with self._lock:
+            if generation != self._generation: # A save invalidated the cache while the query ran; the answer may predate it
+                return
+            self._cache[key] = (time.monotonic() + self.ttl, record)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_items:
+                self._cache.popitem(last=False)
+
+    def find(self, number): # Return the record for a phone number as a dict, or None
+        return self.find_many([number])[number]
+
+    def find_many(self, numbers): # Map each requested number to its record dict, or None, with one query for the cache misses
+        from database import phone # Imported here so the cache can be used without the Flask app
+        keys = {number: normalize_number(number) for number in numbers}
+        found = {}
+        missing = set()
+        for key in set(keys.values()):
+            if key is None:
+                continue
+            hit, record = self._cached(key)
+            if hit:
+                LOOKUP_CACHE.inc(result="hit")
+                found[key] = record
+            else:
+                LOOKUP_CACHE.inc(result="miss")
+                missing.add(key)
+        if missing:
+            with self._lock:
+                generation = self._generation
+            rows = phone.query.filter(phone.number_key.in_(missing)).all()
+            loaded = {row.number_key: record_to_dict(row) for row in rows}
+            for key in missing:
+                found[key] = loaded.get(key)
+                self._remember(key, found[key], generation)
+        return {number: found.get(key) for number, key in keys.items()}
+
+    def invalidate(self, *numbers): # Forget the given numbers after they were saved; no numbers clears everything
+        with self._lock:
+            self._generation += 1
+            if not numbers:
+                self._cache.clear()
+                return
+            for number in numbers:
+                self._cache.pop(normalize_number(number), None)
+
+
+patients = PatientLookup() # Shared by the routes and the save paths
@@ -0,0 +1,197 @@
+# Description: This file contains Prometheus-style metrics and per-call trace spans for the call pipeline.
+import json
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(labelnames, values, extra=None): # Render {name="value",...}
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{str(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric(object): # Shared bookkeeping for metrics with optional labels
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self): # Lines in the Prometheus text exposition format
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}"]
+
+
+class Counter(Metric): # A value that only goes up
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric): # A value that goes up and down, or is read from a function when scraped
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function): # Read the value from function() at scrape time
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            self.set(self._function())
+        return super().render()
+
+
+class Histogram(Metric): # Observations counted into cumulative buckets
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1 # +Inf, which is also the count
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels): # Observe how long the block takes, in seconds
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_value(self, key, value):
+        counts, total = value
+        lines = []
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            le = "+Inf" if bound == float("inf") else _number(bound)
+            lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, [('le', le)])} {count}")
+        lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_number(round(total, 6))}")
+        lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+
+class Registry(object): # Holds every metric and renders them for /metrics
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STT_FINAL_LATENCY = registry.register(Histogram("stt_final_latency_seconds", "First interim to final STT result of an utterance"))
+GEMINI_LATENCY = registry.register(Histogram("gemini_send_message_seconds", "Gemini send_message until the last streamed chunk"))
+TTS_SYNTHESIS = registry.register(Histogram("tts_synthesis_seconds", "Text-to-speech API call per sentence"))
+TTS_PLAYBACK = registry.register(Histogram("tts_playback_seconds", "Playback of a reply from its first to its last sentence"))
+TIME_TO_FIRST_AUDIO = registry.register(Histogram("turn_time_to_first_audio_seconds", "End of caller speech until the reply starts playing"))
+EXTRACTION = registry.register(Histogram("extraction_seconds", "Field extraction time", ["mode"], buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)))
+DB_COMMIT = registry.register(Histogram("db_commit_seconds", "Database commit time", ["path"]))
+TTS_CACHE = registry.register(Counter("tts_cache_requests_total", "TTS audio cache lookups", ["result"]))
+LOOKUP_CACHE = registry.register(Counter("patient_lookup_cache_requests_total", "Patient lookup cache lookups", ["result"]))
+AUDIO_OVERFLOWS = registry.register(Counter("audio_overflows_total", "Audio chunks lost to capture overflows"))
+AUDIO_UNDERRUNS = registry.register(Counter("audio_underruns_total", "Waits of two chunk periods without captured audio"))
+BARGE_INS = registry.register(Counter("barge_ins_total", "Replies interrupted by the caller"))
+DIALOG_TURNS = registry.register(Counter("dialog_turns_total", "Caller turns by who answered them", ["responder"]))
+EXTRACTION_FIELDS = registry.register(Counter("extraction_fields_total", "Intake fields per finished call, by whether they were extracted", ["field", "result"]))
+ACTIVE_SESSIONS = registry.register(Gauge("active_sessions", "Calls currently open"))
+
+
+class CallTrace(object): # Spans of one call, so a slow call can be broken down stage by stage
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.started = time.monotonic()
+        self.spans = []
+        self._lock = Lock()
+
+    def add_span(self, name, start, end, **attributes): # Record a span from two monotonic timestamps
+        with self._lock:
+            self.spans.append({
+                "name": name,
+                "start_ms": round((start - self.started) * 1000, 1),
+                "duration_ms": round((end - start) * 1000, 1),
+                **attributes,
+            })
+
+    @contextmanager
+    def span(self, name, **attributes): # Record the block as a span
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.monotonic(), **attributes)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        return {"session_id": self.session_id, "duration_ms": round((time.monotonic() - self.started) * 1000, 1), "spans": spans}
+
+
+RECENT_TRACES = deque(maxlen=200) # Finished call traces, newest last
+SLOW_TURN_SECONDS = 2.0 # A call is logged as slow when any reply took longer than this to start playing
+
+
+def finish_trace(trace): # Keep a finished trace for /traces and log it when the call was slow
+    data = trace.to_dict()
+    RECENT_TRACES.append(data)
+    if any(span["name"] == "time_to_first_audio" and span["duration_ms"] > SLOW_TURN_SECONDS * 1000 for span in data["spans"]):
+        logging.warning(f"Slow call trace: {json.dumps(data)}")
+    return data
+
+
+def find_trace(session_id): # The most recent finished trace of a call, or None
+    for data in reversed(RECENT_TRACES):
+        if data["session_id"] == session_id:
+            return data
+    return None
@@ -0,0 +1,238 @@
+# Description: This file contains the ConversationPipeline class which overlaps the STT, Gemini and TTS stages of a call.
+import logging
+import queue
+import re
+import time
+from threading import Lock, Thread, Timer
+
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+') # A sentence ends at . ! or ? followed by whitespace
+
+
+class SentenceSplitter(object): # Collect streamed text and hand out complete sentences
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, text): # Add a chunk of text and return the sentences it completes
+        self._pending += text
+        parts = SENTENCE_END.split(self._pending)
+        self._pending = parts.pop()
+        return [part.strip() for part in parts if part.strip()]
+
+    def flush(self): # Return whatever is left once the stream has ended
+        rest, self._pending = self._pending.strip(), ""
+        return [rest] if rest else []
+
+
+class Turn(object): # One caller utterance and the timings of everything done with it
+    def __init__(self, text, first_heard, final_at):
+        self.text = text
+        self.reply = ""
+        self.interrupted = False # Set when the caller talks over the reply
+        self.started = False # Set once the Gemini stage has taken the turn; until then a late STT final may amend its text
+        self.marks = {"first_heard": first_heard, "final": final_at}
+
+    def mark(self, name): # Record the time an event happened
+        self.marks[name] = time.monotonic()
+
+    def mark_once(self, name): # Record the time an event first happened
+        self.marks.setdefault(name, time.monotonic())
+
+    @property
+    def speech_end_mark(self): # The VAD end of the caller's speech when it was seen, otherwise the STT final
+        return "vad_end" if "vad_end" in self.marks else "final"
+
+    def timings(self): # Per-stage latencies in milliseconds
+        m = self.marks
+        spans = {
+            "stt": ("first_heard", "final"),
+            "gemini": ("gemini_start", "gemini_end"),
+            "gemini_first_sentence": ("gemini_start", "first_sentence"),
+            "synthesis": ("synthesis_start", "synthesis_end"),
+            "playback": ("playback_start", "playback_end"),
+            "queue_wait": ("final", "gemini_start"),
+            "until_barge_in": ("playback_start", "barge_in"),
+            "turn": (self.speech_end_mark, "playback_start"), # End of caller speech to first bot audio, i.e. time-to-first-audio
+        }
+        return {name: round((m[end] - m[start]) * 1000, 1) for name, (start, end) in spans.items() if start in m and end in m}
+
+
+class Segment(object): # One sentence of a reply on its way to the speaker
+    def __init__(self, turn, text, last=False):
+        self.turn = turn
+        self.text = text # None for the end-of-reply marker
+        self.last = last # True for the end-of-reply marker
+        self.audio = None
+
+
+class ConversationPipeline(object): # Create a ConversationPipeline class with bounded queues between the stages
+    def __init__(self, session, send_message, synthesize, player, maxsize=8, on_turn=None, final_grace=0.6):
+        self.session = session
+        self._send_message = send_message # Callable taking the caller text and yielding the reply as streamed text chunks
+        self._synthesize = synthesize # Callable taking text and returning audio samples
+        self._player = player # Non-blocking player with play(audio) -> handle and cancel_all()
+        self._on_turn = on_turn # Called with each finished Turn, e.g. to record metrics
+        self._replies = queue.Queue(maxsize=maxsize) # Final transcripts waiting for Gemini
+        self._speech = queue.Queue(maxsize=maxsize) # Reply sentences waiting to be synthesized
+        self._audio = queue.Queue(maxsize=maxsize) # Synthesized sentences waiting to be played
+        self.timings = [] # Timings of every completed turn
+        self.last_reply = None # What the caller was last asked, for extractors that need the question
+        self._lock = Lock()
+        self._interim = None # Latest interim transcript of the utterance in progress, with when it was first heard
+        self._promoted = None # The turn started from the interim of the utterance in progress, if end-of-speech started one
+        self._utterance = 0 # Counts finals, so a late grace timer cannot promote the next utterance
+        self._vad_end = None # When the VAD last saw the caller stop talking, for the next final's turn
+        self.final_grace = final_grace # Longest wait after the VAD end for the STT final before the interim is used instead
+        self._speaking = None # The turn whose reply is playing
+        self._workers = [
+            Thread(target=self._stage, args=(self._replies, self._gemini, self._speech), name="gemini", daemon=True),
+            Thread(target=self._stage, args=(self._speech, self._synthesis, self._audio), name="synthesis", daemon=True),
+            Thread(target=self._stage, args=(self._audio, self._playback, None), name="playback", daemon=True),
+        ]
+
+    def run(self, responses): # Drain the recognition responses, handing final results to the other stages
+        for worker in self._workers:
+            worker.start()
+        try:
+            self._recognize(responses)
+        finally:
+            self._replies.put(None) # Shut the stages down once everything queued has been handled
+            for worker in self._workers:
+                worker.join()
+        return self.session.full_transcript
+
+    def end_of_speech(self): # Called by the VAD: give the STT final a short grace period, then start the turn from the interim
+        vad_end = time.monotonic()
+        with self._lock:
+            self._vad_end = vad_end
+            if self._interim is None or self._promoted is not None:
+                return
+            utterance = self._utterance
+        timer = Timer(self.final_grace, self._promote, args=(utterance, vad_end))
+        timer.daemon = True
+        timer.start()
+
+    def _promote(self, utterance, vad_end): # The final is late: start the turn from the latest interim
+        with self._lock:
+            if utterance != self._utterance or self._interim is None or self._promoted is not None:
+                return # The final arrived within the grace period
+            text, first_heard = self._interim
+            turn = Turn(text, first_heard, time.monotonic())
+            turn.marks["vad_end"] = vad_end
+            self._promoted = turn
+        self._replies.put(turn)
+
+    def _recognize(self, responses): # Print interim results and queue final ones without waiting on Gemini or TTS
+        num_chars_printed = 0
+        first_heard = None
+        for response in responses: # Iterate through responses
+            if not response.results:
+                continue
+            result = response.results[0]
+            if not result.alternatives:
+                continue
+            transcript = result.alternatives[0].transcript # Get the transcript
+            if not transcript:
+                continue
+            if first_heard is None:
+                first_heard = time.monotonic()
+            overwrite_chars = ' ' * (num_chars_printed - len(transcript))
+            print(transcript + overwrite_chars, end='\r')
+            num_chars_printed = len(transcript)
+            if result.is_final: # If the result is final
+                print('\n' + transcript)
+                with self._lock:
+                    promoted = self._promoted
+                    vad_end, self._vad_end = self._vad_end, None
+                    self._interim = None
+                    self._promoted = None
+                    self._utterance += 1
+                    if promoted is not None and not promoted.started: # Still queued: answer the final instead of the interim
+                        promoted.text = transcript
+                self.session.add_segment(transcript, self.last_reply) # The final is kept even when the interim already started the turn
+                if promoted is None:
+                    if transcript.strip(): # If the transcript is not empty
+                        turn = Turn(transcript, first_heard, time.monotonic())
+                        if vad_end is not None and vad_end >= first_heard: # Not a VAD end left over from before this utterance
+                            turn.marks["vad_end"] = vad_end
+                        self._replies.put(turn)
+                elif promoted.text != transcript:
+                    logging.warning(f"Session {self.session.session_id} answered an interim transcript; "
+                                    f"the final arrived more than {self.final_grace}s after the end of speech")
+                num_chars_printed = 0
+                first_heard = None
+            elif transcript.strip():
+                with self._lock:
+                    if self._promoted is None:
+                        self._interim = (transcript, first_heard)
+
+    def _stage(self, inbox, work, outbox): # Run one stage until it receives the shutdown sentinel
+        while True:
+            item = inbox.get()
+            if item is None:
+                if outbox is not None:
+                    outbox.put(None)
+                return
+            try:
+                for result in work(item): # A stage may produce any number of items for the next one
+                    if outbox is not None:
+                        outbox.put(result)
+            except Exception as e:
+                logging.error(f"Pipeline stage failed for session {self.session.session_id}: {e}")
+
+    def _gemini(self, turn): # Stream the reply from the chatbot and pass on each sentence as soon as it is complete
+        with self._lock:
+            turn.started = True # From here on the text is fixed
+            text = turn.text
+        turn.mark("gemini_start")
+        splitter = SentenceSplitter()
+        for chunk in self._send_message(text):
+            turn.reply += chunk
+            for sentence in splitter.feed(chunk):
+                turn.mark_once("first_sentence")
+                yield Segment(turn, sentence)
+        for sentence in splitter.flush():
+            turn.mark_once("first_sentence")
+            yield Segment(turn, sentence)
+        turn.mark("gemini_end")
+        self.last_reply = turn.reply
+        print(turn.reply) # Print the response from the chatbot
+        yield Segment(turn, None, last=True) # Marks the end of the reply
+
+    def _synthesis(self, segment): # Turn one sentence into audio
+        if segment.text is not None:
+            segment.turn.mark_once("synthesis_start")
+            segment.audio = self._synthesize(segment.text)
+            segment.turn.mark("synthesis_end")
+        yield segment
+
+    def _playback(self, segment): # Play one sentence while the rest of the reply and the next turn are processed
+        turn = segment.turn
+        if segment.audio is not None and not turn.interrupted: # The rest of an interrupted reply is dropped
+            turn.mark_once("playback_start")
+            self._speaking = turn
+            self._player.play(segment.audio).wait()
+        if segment.last:
+            self._speaking = None
+            turn.mark("playback_end")
+            timings = turn.timings()
+            timings["interrupted"] = turn.interrupted
+            self.timings.append(timings)
+            if self._on_turn is not None:
+                self._on_turn(turn)
+            logging.info(f"Turn timings for session {self.session.session_id}: {timings}")
+        return ()
+
+    @property
+    def speaking(self): # True while the bot's voice is coming out of the speaker
+        return self._player.is_playing
+
+    def barge_in(self): # The caller started talking: stop the reply that is playing
+        turn = self._speaking
+        if turn is None or turn.interrupted:
+            return False
+        turn.interrupted = True
+        turn.mark("barge_in")
+        self._player.cancel_all()
+        logging.info(f"Caller barged in on session {self.session.session_id}")
+        return True
@@ -0,0 +1,84 @@
+# Description: This file contains the PlaybackEngine class which plays synthesized speech without blocking and can be interrupted.
+from collections import deque
+from threading import Event, Lock
+
+
+class PlaybackHandle(object): # Returned by play(); lets the caller wait for or cancel one piece of audio
+    def __init__(self, audio):
+        self.audio = audio
+        self.position = 0 # Samples already sent to the device
+        self.cancelled = False
+        self._done = Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def finish(self):
+        self._done.set()
+
+    def cancel(self): # Stop playing; the device goes quiet within one block
+        self.cancelled = True
+        self._done.set()
+
+    def wait(self, timeout=None): # Block until the audio has played or was cancelled
+        return self._done.wait(timeout)
+
+
+class PlaybackEngine(object): # Create a PlaybackEngine class feeding a callback-driven output stream from a queue
+    def __init__(self, rate, block_ms=20):
+        self.rate = rate
+        self.blocksize = int(rate * block_ms / 1000) # Cancellation takes effect within one block
+        self._queue = deque()
+        self._lock = Lock()
+        self._stream = None
+
+    def _ensure_stream(self): # Open the output stream on first use and keep it open
+        if self._stream is None:
+            import sounddevice as sd
+            self._stream = sd.OutputStream(samplerate=self.rate, channels=1, dtype='int16', blocksize=self.blocksize,
+                                           latency='low', callback=self._callback)
+            self._stream.start()
+
+    def play(self, audio): # Queue audio and return at once
+        handle = PlaybackHandle(audio)
+        with self._lock:
+            self._queue.append(handle)
+            self._ensure_stream()
+        return handle
+
+    def cancel_all(self): # Stop the current audio and drop everything queued
+        with self._lock:
+            for handle in self._queue:
+                handle.cancel()
+            self._queue.clear()
+
+    @property
+    def is_playing(self):
+        with self._lock:
+            return any(not handle.done for handle in self._queue)
+
+    def _callback(self, outdata, frames, time_info, status): # Runs on the audio thread for every output block
+        out = outdata[:, 0]
+        filled = 0
+        with self._lock:
+            while filled < frames and self._queue:
+                handle = self._queue[0]
+                if handle.cancelled:
+                    self._queue.popleft()
+                    continue
+                count = min(frames - filled, len(handle.audio) - handle.position)
+                out[filled:filled + count] = handle.audio[handle.position:handle.position + count]
+                handle.position += count
+                filled += count
+                if handle.position >= len(handle.audio):
+                    self._queue.popleft()
+                    handle.finish()
+        out[filled:] = 0 # Silence when there is nothing to play
+
+    def close(self):
+        self.cancel_all()
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
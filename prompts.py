@@ -0,0 +1,34 @@
+# Description: This file contains the fixed intake script spoken to the caller and the Gemini system instruction built from it.
+
+# The scripted questions, in the order they are asked
+SCRIPT_PROMPTS = [
+    "Hello, let’s collect some information to expedite your call. What is your callback number?",
+    "I have your callback number as {number}. Is that correct?",
+    "Are you the patient?",
+    "Great, could you please provide me with your date of birth?",
+    "Could you please provide the first three letters of your last name?",
+    "Got it. Are you a biological male or female?",
+    "What state are you in right now?",
+    "Perfect. In a few words, please tell me your main symptom or reason for the call today.",
+    "Give me a moment. We are all set.",
+]
+
+SLOT_PROMPTS = { # The question that fills each slot
+    "number": "What is your callback number?",
+    "patient": "Are you the patient?",
+    "dob": "Great, could you please provide me with your date of birth?",
+    "lastName": "Could you please provide the first three letters of your last name?",
+    "gender": "Got it. Are you a biological male or female?",
+    "state": "What state are you in right now?",
+    "symptom": "Perfect. In a few words, please tell me your main symptom or reason for the call today.",
+}
+
+SYSTEM_INSTRUCTION = ("Ask each of these questions: Hello, let’s collect some information to expedite your call. What is your callback number? After they give you the call back number ask the next question. Ensure that they give you a nine digit number."
+                      "I have your callback number as {number}. Is that correct? "
+                      "Are you the patient? "
+                      "Great, could you please provide me with your date of birth? "
+                      "Could you please provide the first three letters of your last name? "
+                      "Got it. Are you a biological male or female? "
+                      "What state are you in right now? "
+                      "Perfect. In a few words, please tell me your main symptom or reason for the call today. "
+                      "Give me a moment. We are all set.")
@@ -0,0 +1,124 @@
+# Description: This file contains a command-line tool that re-runs extraction over recorded transcripts and saves the results in bulk.
+# Usage: python reprocess.py TRANSCRIPTS [--workers N] [--chunk-size N] [--batch-size N] [--dry-run]
+import argparse
+import itertools
+import json
+import logging
+import os
+import time
+from multiprocessing import Pool
+
+from extraction import extract_all
+from lookup import normalize_number
+
+
+def read_transcripts(path): # Yield (id, transcript) pairs from a JSONL file or a directory of .txt/.jsonl files
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            file_path = os.path.join(path, name)
+            if name.endswith('.jsonl'):
+                yield from read_transcripts(file_path)
+            elif name.endswith('.txt'):
+                with open(file_path, encoding='utf-8') as f:
+                    yield name, f.read()
+        return
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield record.get('id', f"{path}:{line_number}"), record.get('transcript') or record.get('text') or ""
+
+
+def chunked(iterable, size): # Group an iterable into lists of at most size items
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def extract_chunk(chunk): # Runs in a worker process: extract the details of a whole chunk of transcripts
+    results = []
+    for transcript_id, transcript in chunk:
+        details = extract_all(transcript)
+        results.append((transcript_id, details if any(details.values()) else None))
+    return results
+
+
+_engine = None
+
+
+def get_engine(): # One engine for the whole run, built straight from the database URL so the Flask app is never loaded
+    global _engine
+    if _engine is None:
+        from sqlalchemy import create_engine
+        from database import database_url
+        _engine = create_engine(database_url())
+    return _engine
+
+
+DELETE_CHUNK = 500 # Keys per DELETE, under the bound-parameter limit of older SQLite builds
+
+
+def save_batch(rows): # Save a batch of records in a single transaction, replacing earlier rows for the same number
+    from database import phone # Imported here so worker processes never load SQLAlchemy
+    table = phone.__table__
+    latest = {} # The last record of each number wins, as it does across batches
+    for row in rows:
+        key = normalize_number(row.get('number'))
+        latest[key] = dict(row, number_key=key) # Core inserts skip the model's validators
+    keys = list(latest)
+    try:
+        with get_engine().begin() as connection: # A delete then an insert, instead of SQLite's INSERT OR REPLACE, works on any database
+            for start in range(0, len(keys), DELETE_CHUNK):
+                connection.execute(table.delete().where(table.c.number_key.in_(keys[start:start + DELETE_CHUNK])))
+            connection.execute(table.insert(), list(latest.values()))
+    except Exception as e:
+        logging.error(f"Error saving batch of {len(latest)} records: {e}")
+        raise
+    return len(latest)
+
+
+def reprocess(path, workers=None, chunk_size=256, batch_size=5000, dry_run=False): # Extract every transcript and save the results, returning the counts
+    started = time.perf_counter()
+    processed = saved = skipped = 0
+    batch = []
+    with Pool(processes=workers) as pool:
+        for results in pool.imap(extract_chunk, chunked(read_transcripts(path), chunk_size)):
+            processed += len(results)
+            for _, details in results:
+                if not details:
+                    continue
+                if normalize_number(details.get('number')) is None: # Only findable by number, and a re-run could not tell it was saved before
+                    skipped += 1
+                    continue
+                batch.append(details)
+            if len(batch) >= batch_size:
+                saved += len(batch) if dry_run else save_batch(batch)
+                batch = []
+    if batch:
+        saved += len(batch) if dry_run else save_batch(batch)
+    elapsed = time.perf_counter() - started
+    return {"processed": processed, "saved": saved, "skipped": skipped, "seconds": round(elapsed, 3),
+            "transcripts_per_second": round(processed / elapsed, 1) if elapsed else None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-run extraction over recorded transcripts and save the results.")
+    parser.add_argument('path', help="A JSONL file of {\"id\", \"transcript\"} records, or a directory of .txt/.jsonl files")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument('--chunk-size', type=int, default=256, help="Transcripts per work unit sent to a worker")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Records per database transaction")
+    parser.add_argument('--dry-run', action='store_true', help="Extract only, do not write to the database")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    stats = reprocess(args.path, args.workers, args.chunk_size, args.batch_size, args.dry_run)
+    print(f"Processed {stats['processed']} transcripts, saved {stats['saved']} records and skipped {stats['skipped']} without a callback number "
+          f"in {stats['seconds']}s ({stats['transcripts_per_second']} transcripts/s)")
+    return stats
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+# Description: This file contains the routes of the app. Call handling modules are imported inside the routes that use them, so the lookup pages and CLI tools start without the audio and Google SDKs.
+import logging
+
+from flask import Blueprint, render_template, redirect, url_for, jsonify, request, Response, abort, current_app
+
+from clients import provider
+from forms import LookUpForm
+from lookup import patients
+from metrics import registry, RECENT_TRACES, find_trace
+from sessions import SessionLimitError, finish_call
+
+bp = Blueprint('intake', __name__, cli_group=None) # cli_group=None keeps commands at the top level, e.g. flask warm-tts
+
+MAX_BATCH_LOOKUP = 100
+
+
+def get_sessions(): # The SessionManager of the running app
+    return current_app.extensions['sessions']
+
+
+def get_writer(): # The WriteBehindWriter of the running app
+    return current_app.extensions['writer']
+
+
+def wants_durable_save(): # Callers that need the record on disk before the response pass "sync": true
+    data = request.get_json(silent=True) or {}
+    return bool(data.get('sync')) or request.args.get('sync') == '1'
+
+
+def get_session_id(): # Read the session ID from the JSON body or the query string
+    data = request.get_json(silent=True) or {}
+    return data.get('session_id') or request.args.get('session_id')
+
+
+
+
+@bp.route('/transcribe/start', methods=['POST']) # This is the transcription start route
+def start_transcription(): # This function will be called when the URL is of the form '/transcribe/start'
+    from stream import process_stream # Loads numpy and the call pipeline on the first call
+    try:
+        session = get_sessions().create(get_session_id()) # Create a session for this call
+    except SessionLimitError as e:
+        return jsonify({"status": str(e)}), 503
+    with session.lock:
+        if session.thread is None: # Once only: a WAV source that has ended is closed but must not be replayed
+            session.start(process_stream) # Start the stream and process it on a worker thread
+    return jsonify({"status": "transcription started", "session_id": session.session_id})
+
+
+
+
+
+@bp.route('/transcribe/stop', methods=['POST']) # This is the transcription stop route
+def stop_transcription(): # This function will be called when the URL is of the form '/transcribe/stop'
+    sessions = get_sessions()
+    session = sessions.get(get_session_id())
+    if session is None:
+        return jsonify({"status": "Transcription not active or already stopped"})
+    details = None
+    with session.lock: # Ensure only one thread can stop this session at a time
+        if session.stopped:
+            return jsonify({"status": "Transcription not active or already stopped"})
+        try:
+            details = finish_call(session, timeout=5) # Shared with idle eviction, so both save the same record
+            if session.transcript:
+                response_message = "Transcription stopped, no valid data extracted."
+            else:
+                response_message = "Transcription stopped, but no transcript was processed."
+        except Exception as e:
+            logging.error(f"Error processing stream: {e}")
+            response_message = "Error stopping transcription and processing data."
+        finally:
+            sessions.remove(session.session_id)
+    if details: # Saved on the writer thread, outside the session lock
+        ticket = get_writer().submit(details)
+        if wants_durable_save():
+            if ticket.wait(timeout=10):
+                response_message = "Transcription stopped, data processed and saved."
+            else:
+                response_message = "Transcription stopped, data processing succeeded but save failed."
+        else:
+            response_message = "Transcription stopped, data processed and queued for saving."
+    return jsonify({"status": response_message, "session_id": session.session_id})
+
+
+
+@bp.route('/health') # Reports whether the shared Speech, TTS and Gemini clients are usable
+def health():
+    status = provider.health()
+    return jsonify({"clients": status, "sessions": len(get_sessions())}), 200 if all(status.values()) else 503
+
+
+
+@bp.route('/api/lookup', methods=['POST']) # Batch lookup for the intake dashboard: {"numbers": [...]} -> {"results": {number: record or null}}
+def batch_lookup():
+    data = request.get_json(silent=True) or {}
+    numbers = data.get('numbers')
+    if not isinstance(numbers, list) or not all(isinstance(number, str) for number in numbers):
+        return jsonify({"error": "Expected a JSON body with a list of numbers"}), 400
+    if len(numbers) > MAX_BATCH_LOOKUP:
+        return jsonify({"error": f"At most {MAX_BATCH_LOOKUP} numbers per request"}), 400
+    return jsonify({"results": patients.find_many(numbers)})
+
+
+
+@bp.route('/metrics') # Prometheus scrape endpoint
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+
+@bp.route('/traces') # The most recent finished call traces
+def traces():
+    return jsonify(list(RECENT_TRACES)[-50:])
+
+
+
+@bp.route('/traces/<session_id>') # The trace of one call, live or finished
+def call_trace(session_id):
+    session = get_sessions().get(session_id)
+    trace = session.trace.to_dict() if session is not None else find_trace(session_id)
+    if trace is None:
+        abort(404)
+    return jsonify(trace)
+
+
+
+@bp.cli.command('warm-tts') # Run with: flask --app app warm-tts
+def warm_tts(): # Pre-render the scripted prompts into the TTS audio cache
+    from prompts import SCRIPT_PROMPTS
+    from stream import warm_tts_cache
+    rendered = warm_tts_cache(SCRIPT_PROMPTS)
+    print(f"Cached {rendered} prompt sentences.")
+
+
+
+@bp.route('/', methods=["GET", "POST"]) # This is the home page route
+def lookup_number(): # This function will be called when the URL is of the form '/'
+    form = LookUpForm(csrf_enabled=False) # Create an instance of the LookUpForm class
+    if form.validate_on_submit():
+        number = form.number.data # Get the phone number from the form
+        phone_number = patients.find(number) # Look the number up through the cache
+        if phone_number:
+            return redirect(url_for('intake.patient_info', number=phone_number['number'])) # Redirect to the patient_info route with the stored phone number
+    return render_template('lookup.html', form=form)
+
+
+
+@bp.route('/<number>') # This is a dynamic route that accepts a phone number
+def patient_info(number): # This function will be called when the URL is of the form '/<number>'
+    phone_number = patients.find(number) # Any formatting of the number finds the same record
+    if phone_number is None:
+        abort(404)
+    return render_template('patient_info.html', phone_number=phone_number) # Render the patient_info.html template with the phone_number variable
@@ -0,0 +1,150 @@
+# Description: This file contains the CallSession and SessionManager classes which keep the state of each active call.
+import logging
+import time
+import uuid
+from threading import Lock, Thread, current_thread
+
+from extraction import IncrementalExtractor
+from dialog import DialogManager
+from metrics import CallTrace, EXTRACTION, EXTRACTION_FIELDS, finish_trace
+
+
+def open_microphone(rate, chunk): # Default audio source; imported here so numpy and the sound device load only when a call starts
+    from MicrophoneStream import MicrophoneStream
+    return MicrophoneStream(rate, chunk)
+
+
+def finish_call(session, timeout=None): # Stop a call, record its extraction hits and trace, and return its intake record or None
+    try:
+        session.stop(timeout=timeout) # Waits for the last bits of audio to be processed
+        return session.extractor.details() if session.transcript else None # Already extracted segment by segment
+    finally:
+        for field, value in session.extractor.slots.items(): # Per-field extraction hit rates
+            EXTRACTION_FIELDS.inc(field=field, result="hit" if value is not None else "miss")
+        finish_trace(session.trace)
+
+
+class SessionLimitError(Exception): # Raised when the concurrent session cap has been reached
+    pass
+
+
+class CallSession(object): # Create a CallSession class holding everything owned by one call
+    def __init__(self, session_id, stream, chat):
+        self.session_id = session_id
+        self.stream = stream # The audio source for this call
+        self.chat = chat # The Gemini chat history for this call
+        self.transcript = [] # Final STT segments in the order they were heard
+        self.extractor = IncrementalExtractor() # Intake fields, filled as each segment arrives
+        self.dialog = DialogManager(self.extractor) # Runs the script locally, Gemini is the fallback
+        self.trace = CallTrace(session_id) # Per-call spans for the metrics surface
+        self.stopped = False # Set by stop(); the audio source may close on its own first, e.g. at the end of a WAV file
+        self.timings = [] # Per-turn stage latencies from the conversation pipeline
+        self.pipeline = None # The conversation pipeline while the call is being processed
+        self.lock = Lock() # Serialises start/stop for this call only
+        self.thread = None
+        self.created_at = time.monotonic()
+        self.last_active = self.created_at
+
+    def touch(self): # Mark the session as active
+        self.last_active = time.monotonic()
+
+    def add_segment(self, segment, question=None): # Append a final transcript segment and extract what it answers
+        self.transcript.append(segment)
+        with EXTRACTION.time(mode="incremental"):
+            self.extractor.feed(segment, question)
+        self.touch()
+
+    def speech_event(self, event): # Voice activity events from the audio gate
+        self.touch()
+        if self.pipeline is None:
+            return
+        if event == 'start':
+            self.pipeline.barge_in() # Stop the bot as soon as the caller talks over it
+        elif event == 'end':
+            self.pipeline.end_of_speech() # Take the turn as soon as the caller stops talking
+
+    @property
+    def bot_speaking(self): # True while a reply is playing, used to gate out the bot's own echo
+        return self.pipeline is not None and self.pipeline.speaking
+
+    @property
+    def full_transcript(self): # The whole transcript as a single string
+        return " ".join(self.transcript)
+
+    @property
+    def active(self): # True while the audio source is open
+        return self.stream is not None and not self.stream._closed
+
+    def start(self, target): # Start the stream and run target(session) on a worker thread
+        self.stream.start()
+        self.thread = Thread(target=target, args=(self,), name=f"call-{self.session_id}", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None): # Stop the stream and wait for the worker thread to finish
+        self.stopped = True
+        if self.stream is not None:
+            self.stream.stop()
+        if self.thread is not None and self.thread is not current_thread():
+            self.thread.join(timeout)
+
+
+class SessionManager(object): # Create a SessionManager class keyed by call ID
+    def __init__(self, chat_factory, rate, chunk, max_sessions=20, idle_timeout=300, stream_factory=open_microphone, on_evict=None):
+        self._chat_factory = chat_factory # Callable returning a fresh chat session
+        self._stream_factory = stream_factory # Callable taking (rate, chunk) and returning an audio source
+        self._on_evict = on_evict # Callable taking the intake record of an evicted call, e.g. to save it
+        self._rate = rate
+        self._chunk = chunk
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout # Seconds without activity before a session is evicted
+        self._sessions = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def create(self, session_id=None): # Create a new session, evicting idle ones first
+        self.evict_idle()
+        session_id = session_id or uuid.uuid4().hex
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.touch()
+                return session
+            if len(self._sessions) >= self.max_sessions:
+                raise SessionLimitError(f"Session limit of {self.max_sessions} reached")
+            session = CallSession(session_id, self._stream_factory(self._rate, self._chunk), self._chat_factory())
+            self._sessions[session_id] = session
+        return session
+
+    def get(self, session_id): # Return the session for the call ID, or None
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def remove(self, session_id): # Forget a session and return it
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def evict_idle(self): # Finish and forget sessions that have been idle for too long, handing their records to on_evict
+        now = time.monotonic()
+        with self._lock:
+            expired = [s for s in self._sessions.values() if now - s.last_active > self.idle_timeout]
+            for session in expired:
+                del self._sessions[session.session_id]
+        for session in expired:
+            if not session.lock.acquire(blocking=False): # Its own stop request is already shutting it down
+                continue
+            details = None
+            try:
+                if session.stopped: # Its own stop request finished it first
+                    continue
+                logging.info(f"Evicting idle session {session.session_id}")
+                details = finish_call(session, timeout=0)
+            except Exception as e:
+                logging.error(f"Error evicting session {session.session_id}: {e}")
+            finally:
+                session.lock.release()
+            if details and self._on_evict is not None:
+                self._on_evict(details)
+        return len(expired)
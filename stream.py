@@ -1,110 +1,203 @@
 # Description: This file contains the functions that are used to process the audio stream from the microphone.
-from google.cloud import speech
-from google.cloud import texttospeech
-import sounddevice as sd
-from app import app, RATE
 import numpy as np
+import io
+import os
 import logging
-from database import save_to_database
-from app import chat
-from extraction import extract_callback_number, extract_is_patient, extract_date_of_birth, extract_last_name_letters, extract_gender, extract_state, extract_symptom
-
-
-def listen_print_loop(responses, stream): # Print the transcriptions and send the responses to the chatbot
-    num_chars_printed = 0
-    buffer = ""
-    full_transcript = ""
-    for response in responses: # Iterate through responses
-        if not response.results:
-            continue
-        result = response.results[0]
-        if not result.alternatives:
-            continue
-        transcript = result.alternatives[0].transcript # Get the transcript
-        if transcript:
-            overwrite_chars = ' ' * (num_chars_printed - len(transcript))
-            print(transcript + overwrite_chars, end='\r')
-            num_chars_printed = len(transcript)
-            if result.is_final: # If the result is final
-                full_transcript += transcript + " "
-                buffer += transcript
-                print('\n' + buffer)
-
-                if buffer.strip(): # If the buffer is not empty
-                    response = chat.send_message(buffer) # Send the buffer to the chatbot
-                    print(response.text) # Print the response from the chatbot
-                    synthesize_text(response.text) # Synthesize the text
-                buffer = ""
-                num_chars_printed = 0
-
-    return full_transcript
-
-
-
-def synthesize_text(text): # Synthesize the text to speech
-    client = texttospeech.TextToSpeechClient() # Create a text to speech client
+import time
+import wave
+from threading import Lock
+from pipeline import ConversationPipeline, SentenceSplitter
+from tts_cache import AudioCache
+from vad import VoiceActivityDetector, gate_silence
+from metrics import (GEMINI_LATENCY, TTS_SYNTHESIS, TTS_PLAYBACK, STT_FINAL_LATENCY, TIME_TO_FIRST_AUDIO, EXTRACTION,
+                     AUDIO_OVERFLOWS, AUDIO_UNDERRUNS, BARGE_INS, DIALOG_TURNS)
+from clients import provider, get_speech_client
+from extraction import extract_all
+from prompts import SCRIPT_PROMPTS
+
+VOICE_NAME = "en-US-Standard-I"
+TTS_RATE = 24000
+INSTANCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance') # The app's instance folder
+_audio_cache = None
+_audio_cache_lock = Lock()
+
+
+def get_audio_cache(): # The shared TTS cache, created on first use so importing this module touches no files
+    global _audio_cache
+    if _audio_cache is None:
+        with _audio_cache_lock:
+            if _audio_cache is None:
+                _audio_cache = AudioCache(os.getenv('TTS_CACHE_DIR', os.path.join(INSTANCE_PATH, 'tts_cache')),
+                                          max_disk_bytes=int(os.getenv('TTS_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
+    return _audio_cache
+
+
+def script_sentences(prompts): # The fixed sentences of the scripted prompts, split the same way the pipeline does so the cache keys match
+    sentences = []
+    for prompt in prompts:
+        splitter = SentenceSplitter()
+        for sentence in splitter.feed(prompt) + splitter.flush():
+            if '{' not in sentence: # Skip templated sentences such as the callback number confirmation
+                sentences.append(sentence)
+    return sentences
+
+
+SCRIPT_SENTENCES = {" ".join(sentence.split()) for sentence in script_sentences(SCRIPT_PROMPTS)} # The only text the disk tier keeps
+
+
+def listen_print_loop(responses, session): # Print the transcriptions and send the responses to the session's chatbot
+    player = provider.backend.open_player(TTS_RATE) # Non-blocking, so the caller can be heard and can interrupt
+    pipeline = ConversationPipeline( # Recognition, Gemini, synthesis and playback run as overlapped stages
+        session,
+        send_message=lambda text: respond(session, text),
+        synthesize=synthesize_audio,
+        player=player,
+        on_turn=lambda turn: record_turn(session, turn, len(pipeline.timings)), # Timings already include this turn
+    )
+    session.pipeline = pipeline
+    try:
+        return pipeline.run(responses)
+    finally:
+        session.pipeline = None
+        session.timings = pipeline.timings
+        player.close()
+
+
+
+def record_turn(session, turn, index): # Feed a finished turn into the histograms and the call's trace
+    m = turn.marks
+    spans = [
+        ("stt", "first_heard", "final", STT_FINAL_LATENCY),
+        ("reply", "gemini_start", "gemini_end", None),
+        ("synthesis", "synthesis_start", "synthesis_end", None),
+        ("playback", "playback_start", "playback_end", TTS_PLAYBACK),
+        ("time_to_first_audio", turn.speech_end_mark, "playback_start", TIME_TO_FIRST_AUDIO), # Includes the wait for a late STT final
+    ]
+    for name, start, end, histogram in spans:
+        if start in m and end in m:
+            session.trace.add_span(name, m[start], m[end], turn=index) # Never the text: it holds numbers and dates of birth
+            if histogram is not None:
+                histogram.observe(m[end] - m[start])
+    if turn.interrupted:
+        BARGE_INS.inc()
+
+
+
+def respond(session, text): # Answer from the local script when the answer parses, otherwise ask Gemini
+    reply = session.dialog.handle(text)
+    if reply is not None:
+        DIALOG_TURNS.inc(responder="local")
+        yield reply
+        return
+    DIALOG_TURNS.inc(responder="gemini")
+    yield from stream_reply(session.chat, with_next_question(text, session.dialog))
+
+
+
+def with_next_question(text, dialog): # Tell Gemini which scripted question the caller still has to answer
+    if dialog.done or dialog.question is None: # The dialog's question, not the first empty slot: a heard number is filled before it is confirmed
+        return text
+    return f"{text}\n(Next unanswered question: {dialog.question})"
+
+
+
+def stream_reply(chat, text): # Send the text to the chatbot and yield the reply as it streams back
+    started = time.perf_counter()
+    response = chat.send_message(text, stream=True)
+    for chunk in response:
+        if chunk.text:
+            yield chunk.text
+    GEMINI_LATENCY.observe(time.perf_counter() - started)
+
+
+
+def synthesize_audio(text): # Return the audio samples for the text, synthesizing them only on a cache miss
+    on_disk = " ".join(text.split()) in SCRIPT_SENTENCES # Anything else may hold a caller's number, date of birth or symptoms
+    return get_audio_cache().get_or_synthesize(text, VOICE_NAME, TTS_RATE, _synthesize_speech, on_disk)
+
+
+
+def _synthesize_speech(text): # Synthesize the text to speech and return the audio samples
+    from google.cloud import texttospeech # Only needed on a cache miss
     input_text = texttospeech.SynthesisInput(text=text) # Create a synthesis input
     voice = texttospeech.VoiceSelectionParams( # Create a voice selection parameter
         language_code="en-US",
-        name="en-US-Standard-I",
+        name=VOICE_NAME,
         ssml_gender=texttospeech.SsmlVoiceGender.MALE,
     )
     audio_config = texttospeech.AudioConfig( # Create an audio config
         audio_encoding=texttospeech.AudioEncoding.LINEAR16,
+        sample_rate_hertz=TTS_RATE,
     )
-    response = client.synthesize_speech( # Synthesize the speech
-        request={"input": input_text, "voice": voice, "audio_config": audio_config}
+    with TTS_SYNTHESIS.time():
+        response = provider.call('tts', lambda client: client.synthesize_speech( # Synthesize the speech on the shared client
+            request={"input": input_text, "voice": voice, "audio_config": audio_config}
+        ))
+    with wave.open(io.BytesIO(response.audio_content)) as wav: # LINEAR16 comes back with a WAV header
+        return np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16) # Get the audio data
+
+
+
+def warm_tts_cache(prompts): # Pre-render the sentences of the scripted prompts into the disk cache and drop any other files
+    sentences = script_sentences(prompts)
+    cache = get_audio_cache()
+    for sentence in sentences:
+        cache.get_or_synthesize(sentence, VOICE_NAME, TTS_RATE, _synthesize_speech, on_disk=True)
+    removed = cache.retain(sentences, VOICE_NAME, TTS_RATE)
+    if removed:
+        logging.info(f"Removed {removed} TTS cache files that are not scripted prompts")
+    return len(sentences)
+
+
+
+def play_audio(audio_data): # Play the audio samples and wait until they are done
+    player = provider.backend.open_player(TTS_RATE)
+    try:
+        player.play(audio_data).wait()
+    finally:
+        player.close()
+
+
+
+def synthesize_text(text): # Synthesize the text to speech and play it
+    play_audio(synthesize_audio(text))
+
+
+
+def process_stream(session): # Process the audio stream of one call session
+    from google.cloud import speech
+    client = get_speech_client() # Shared across sessions
+    config = speech.RecognitionConfig( # Create a recognition config
+        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+        sample_rate_hertz=session.stream.rate,
+        language_code="en-US",
+        enable_automatic_punctuation=True,
+        model="telephony"
     )
-    audio_data = np.frombuffer(response.audio_content, dtype=np.int16) # Get the audio data
-    sd.play(audio_data, samplerate=24000)
-    sd.wait()
-
-
-
-def process_stream(): # Process the audio stream
-    global global_stream
-    with app.app_context():  # Ensures the use of Flask's application context
-        client = speech.SpeechClient()
-        config = speech.RecognitionConfig( # Create a recognition config
-            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-            sample_rate_hertz=RATE,
-            language_code="en-US",
-            enable_automatic_punctuation=True,
-            model="telephony"
-        )
-        streaming_config = speech.StreamingRecognitionConfig(config=config, interim_results=True)
-        if global_stream is None: # If the stream is not active
-            logging.error("Stream is not active.")
-            return None
-        with global_stream as stream: # Use the stream
-            audio_generator = stream.generator() # Generate audio
-            requests = (speech.StreamingRecognizeRequest(audio_content=content) for content in audio_generator if content and not content.isspace())
-            responses = client.streaming_recognize(streaming_config, requests) # Get the responses
-            try: # Try to process the stream
-                full_transcript = listen_print_loop(responses, stream)
-                if full_transcript:
-                    details = process_full_transcript(full_transcript)
-                    if details: # If the details are valid
-                        save_to_database(details) # Save the details to the database
-                        print("Transcription stopped, data processed and saved.")
-                    else:
-                        print("No valid data extracted.")
-                else:
-                    print("No transcript was processed.")
-            except Exception as e:
-                logging.error(f"Failed to process stream: {e}")
+    streaming_config = speech.StreamingRecognitionConfig(config=config, interim_results=True)
+    if not session.active: # If the stream is not active
+        logging.error(f"Stream for session {session.session_id} is not active.")
+        return None
+    vad = VoiceActivityDetector(session.stream.rate)
+    audio_generator = gate_silence(session.stream.generator(), vad, on_event=session.speech_event, # Only caller speech goes to STT
+                                   echo_active=lambda: session.bot_speaking)
+    requests = (speech.StreamingRecognizeRequest(audio_content=bytes(content)) for content in audio_generator if len(content)) # The protobuf needs its own copy of the chunk
+    responses = client.streaming_recognize(streaming_config, requests) # Get the responses
+    try: # Try to process the stream
+        return listen_print_loop(responses, session)
+    except Exception as e:
+        if provider.backend.is_transient(e): # Make the next session reconnect
+            provider.reset('speech')
+        logging.error(f"Failed to process stream for session {session.session_id}: {e}")
+        return session.full_transcript
+    finally:
+        AUDIO_OVERFLOWS.inc(session.stream.overflows)
+        AUDIO_UNDERRUNS.inc(session.stream.underruns)
 
 
 def process_full_transcript(full_transcript): # Process the full transcript
-    details = { # Create a dictionary of details
-        "number": extract_callback_number(full_transcript),
-        "patient": extract_is_patient(full_transcript),
-        "dob": extract_date_of_birth(full_transcript),
-        "lastName": extract_last_name_letters(full_transcript),
-        "gender": extract_gender(full_transcript),
-        "state": extract_state(full_transcript),
-        "symptom": extract_symptom(full_transcript)
-    }
+    with EXTRACTION.time(mode="full"):
+        details = extract_all(full_transcript) # Create a dictionary of details
     if any(details.values()):
         return details
     else:
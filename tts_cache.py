@@ -0,0 +1,131 @@
+# Description: This file contains the AudioCache class which keeps synthesized speech in memory, and the fixed script sentences on disk.
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+from metrics import TTS_CACHE
+
+
+class AudioCache(object): # Create an AudioCache class keyed by text, voice and sample rate
+    def __init__(self, directory, max_items=256, max_disk_bytes=64 * 1024 * 1024):
+        self.directory = directory # Where the raw int16 PCM files are kept, created on the first disk write
+        self.max_items = max_items # Size of the in-memory LRU tier
+        self.max_disk_bytes = max_disk_bytes # Size cap of the disk tier; the oldest files are removed first
+        self._memory = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text, voice, rate): # Content address of a synthesized phrase
+        text = " ".join(text.split())
+        return hashlib.sha256(f"{voice}\0{rate}\0{text}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pcm")
+
+    def _remember(self, key, audio): # Put audio into the LRU tier, dropping the least recently used
+        with self._lock:
+            self._memory[key] = audio
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def get(self, text, voice, rate, on_disk=False): # Return cached audio samples, or None; on_disk also looks in the disk tier
+        key = self.key(text, voice, rate)
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                TTS_CACHE.inc(result="hit")
+                return audio
+        path = self._path(key)
+        if not on_disk or not os.path.exists(path):
+            with self._lock:
+                self.misses += 1
+            TTS_CACHE.inc(result="miss")
+            return None
+        if os.path.getsize(path):
+            audio = np.memmap(path, dtype=np.int16, mode='r') # Map the file instead of reading it
+        else:
+            audio = np.zeros(0, dtype=np.int16)
+        self._remember(key, audio)
+        with self._lock:
+            self.hits += 1
+        TTS_CACHE.inc(result="hit")
+        return audio
+
+    def put(self, text, voice, rate, audio, on_disk=False): # Store audio samples in memory, and on disk when asked to
+        key = self.key(text, voice, rate)
+        audio = np.ascontiguousarray(audio, dtype=np.int16)
+        if on_disk:
+            self._write(key, audio)
+        self._remember(key, audio)
+        return audio
+
+    def _write(self, key, audio): # Write a file into the disk tier, then trim the tier to its size cap
+        path = self._path(key)
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory) # Unique per writer, so threads synthesizing the same text never share it
+            with os.fdopen(fd, 'wb') as f:
+                audio.tofile(f)
+            os.replace(tmp_path, path) # Readers never see a half-written file
+        except OSError as e:
+            logging.error(f"Could not write TTS cache file {path}: {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._trim()
+
+    def _files(self): # The disk tier's files as (mtime, size, path), oldest first
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".pcm")]
+        except FileNotFoundError:
+            return []
+        files = []
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError: # Removed by another process
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(files)
+
+    def _trim(self): # Remove the oldest files until the disk tier fits in max_disk_bytes
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def retain(self, texts, voice, rate): # Remove every file in the disk tier that is not one of these texts
+        keep = {self._path(self.key(text, voice, rate)) for text in texts}
+        removed = 0
+        for _, _, path in self._files():
+            if path not in keep:
+                self._remove(path)
+                removed += 1
+        return removed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get_or_synthesize(self, text, voice, rate, synthesize, on_disk=False): # Return cached audio, synthesizing it on a miss
+        audio = self.get(text, voice, rate, on_disk)
+        if audio is None:
+            audio = self.put(text, voice, rate, synthesize(text), on_disk)
+        return audio
@@ -0,0 +1,85 @@
+# Description: This file contains the VoiceActivityDetector class and the silence gate that sits between the audio source and STT.
+import logging
+from collections import deque
+
+import numpy as np
+
+
+class VoiceActivityDetector(object): # Create a VoiceActivityDetector class based on frame energy and zero-crossing rate
+    def __init__(self, rate, frame_ms=20, energy_threshold=300.0, max_zero_crossing_rate=0.3, hangover_ms=400, min_speech_ms=60):
+        self.frame_length = int(rate * frame_ms / 1000)
+        self.energy_threshold = energy_threshold # RMS level, in int16 units, that counts as voiced
+        self.max_zero_crossing_rate = max_zero_crossing_rate # Quiet frames crossing zero more often than this are noise
+        self.hangover_frames = max(1, hangover_ms // frame_ms) # Silent frames allowed inside an utterance
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms) # Voiced frames needed to start an utterance
+        self.in_speech = False
+        self._voiced_run = 0
+        self._silent_run = 0
+        self.frames = 0
+        self.speech_frames = 0
+
+    def classify(self, samples, threshold_scale=1.0): # Return a per-frame speech decision for a block of int16 samples
+        usable = len(samples) - len(samples) % self.frame_length
+        if not usable:
+            return np.zeros(0, dtype=bool)
+        frames = samples[:usable].reshape(-1, self.frame_length).astype(np.float32)
+        energy = np.sqrt(np.mean(frames * frames, axis=1))
+        crossings = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+        threshold = self.energy_threshold * threshold_scale
+        voiced = (energy > threshold) & (crossings < self.max_zero_crossing_rate)
+        loud = energy > 3 * threshold # Loud enough to be speech whatever its zero-crossing rate
+        return voiced | loud
+
+    def process(self, chunk, threshold_scale=1.0): # Update the utterance state from a chunk of PCM bytes; returns the 'start'/'end' events it caused
+        decisions = self.classify(np.frombuffer(chunk, dtype=np.int16), threshold_scale)
+        self.frames += len(decisions)
+        self.speech_frames += int(decisions.sum())
+        events = []
+        for is_speech in decisions: # Hangover needs the frames in order, which leaves a handful per chunk
+            if is_speech:
+                self._voiced_run += 1
+                self._silent_run = 0
+                if not self.in_speech and self._voiced_run >= self.min_speech_frames:
+                    self.in_speech = True
+                    events.append('start')
+            else:
+                self._voiced_run = 0
+                if self.in_speech:
+                    self._silent_run += 1
+                    if self._silent_run >= self.hangover_frames:
+                        self.in_speech = False
+                        events.append('end')
+        return events
+
+
+def gate_silence(chunks, vad, on_event=None, keepalive_chunks=10, preroll_chunks=2, echo_active=None, echo_scale=4.0): # Pass speech through to STT and drop the silence around it
+    preroll = deque(maxlen=preroll_chunks) # Copies of the last silent chunks, so word onsets are not clipped
+    silent = 0
+    sent = dropped = 0
+    silence = None
+    for chunk in chunks:
+        was_in_speech = vad.in_speech
+        # While the bot is talking its voice leaks into the mic; only speech well above that level counts as the caller
+        scale = echo_scale if echo_active is not None and echo_active() else 1.0
+        events = vad.process(chunk, scale)
+        if on_event is not None:
+            for event in events:
+                on_event(event)
+        if vad.in_speech or was_in_speech: # Inside an utterance, including its hangover and the chunk that ends it
+            while preroll:
+                yield preroll.popleft()
+                sent += 1
+            silent = 0
+            sent += 1
+            yield chunk
+            continue
+        preroll.append(bytes(chunk)) # The source may reuse the chunk's memory once the next one is requested
+        silent += 1
+        dropped += 1
+        if silent % keepalive_chunks == 0: # A short burst of silence keeps the STT stream from timing out
+            if silence is None:
+                silence = bytes(2 * vad.frame_length)
+            sent += 1
+            yield silence
+    logging.info(f"VAD gate sent {sent} chunks and dropped {dropped} silent ones "
+                 f"({vad.speech_frames}/{vad.frames} frames were speech)")
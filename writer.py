@@ -0,0 +1,118 @@
+# Description: This file contains the WriteBehindWriter class which saves intake records in batches on a background thread.
+import logging
+import queue
+import time
+from threading import Event, Lock, Thread
+
+from metrics import DB_COMMIT
+
+
+class WriteTicket(object): # Returned by submit(); wait() blocks until the record is on disk
+    def __init__(self, details):
+        self.details = details
+        self.error = None
+        self._done = Event()
+
+    def done(self, error=None):
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None): # True once the record has been committed
+        return self._done.wait(timeout) and self.error is None
+
+
+class WriteBehindWriter(object): # Create a WriteBehindWriter class that batches inserts into one transaction
+    def __init__(self, app, db, model, batch_size=200, flush_interval=0.2, on_commit=None):
+        self._app = app
+        self._db = db
+        self._model = model # The table records are saved to
+        self._on_commit = on_commit # Called with the details of every committed batch, e.g. to invalidate read caches
+        self.batch_size = batch_size # Most records committed in one transaction
+        self.flush_interval = flush_interval # Longest a record waits for others to join its batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = Lock()
+        self.written = 0
+        self.failed = 0
+
+    def start(self): # Start the background thread if it is not running
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, details): # Queue a record for saving and return its ticket
+        self.start()
+        ticket = WriteTicket(details)
+        self._queue.put(ticket)
+        return ticket
+
+    def flush(self, timeout=None): # Wait until everything queued so far has been written
+        marker = WriteTicket(None)
+        self.start()
+        self._queue.put(marker)
+        return marker._done.wait(timeout)
+
+    def close(self, timeout=5): # Write what is left and stop the background thread
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not None and len(batch) < self.batch_size: # Gather more records until the batch is full or the interval is up
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is None
+            tickets = [ticket for ticket in batch if ticket is not None]
+            self._write([ticket for ticket in tickets if ticket.details is not None])
+            for ticket in tickets:
+                if ticket.details is None: # Flush markers are acknowledged after everything before them
+                    ticket.done()
+            if stopping:
+                return
+
+    def _committed(self, records): # A failing callback must not make a committed batch look failed
+        if self._on_commit is not None:
+            try:
+                self._on_commit(records)
+            except Exception as e:
+                logging.error(f"on_commit callback failed: {e}")
+
+    def _write(self, tickets): # Commit a batch in one transaction, falling back to one row at a time if it fails
+        if not tickets:
+            return
+        with self._app.app_context():
+            session = self._db.session
+            try:
+                session.add_all([self._model(**ticket.details) for ticket in tickets])
+                with DB_COMMIT.time(path="writer"):
+                    session.commit()
+                self.written += len(tickets)
+                self._committed([ticket.details for ticket in tickets])
+                for ticket in tickets:
+                    ticket.done()
+                logging.info(f"Saved {len(tickets)} records to database")
+                return
+            except Exception as e:
+                session.rollback()
+                logging.error(f"Batch save failed, retrying records one at a time: {e}")
+            for ticket in tickets: # One bad record (e.g. a duplicate number) must not lose the others
+                try:
+                    session.add(self._model(**ticket.details))
+                    session.commit()
+                    self.written += 1
+                    self._committed([ticket.details])
+                    ticket.done()
+                except Exception as e:
+                    session.rollback()
+                    self.failed += 1
+                    logging.error(f"Error saving to database: {e}")
+                    ticket.done(e)